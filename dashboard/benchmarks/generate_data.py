@@ -0,0 +1,215 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from db_util.db_import import FILE_MODEL_MAP, CSV_DATETIME_FORMAT
+
+# Rows per table for each comment, the scale is set by the number of comments
+SCALE_RATIOS = {
+    'users.csv': 0.05,
+    'repositories.csv': 0.0001,
+    'issues.csv': 0.1,
+    'comments_with_sent_emo.csv': 1,
+    'commits.csv': 0.5,
+    'events.csv': 0.5,
+    'file_commits.csv': 1,
+    'files.csv': 0.05,
+    'reactions.csv': 0.5,
+}
+MIN_ROWS = {
+    'users.csv': 100,
+    'repositories.csv': 5,
+}
+
+# Activity concentrates on a few repositories, users and issues
+REPO_SKEW = 1.3
+USER_SKEW = 1.1
+ITEM_SKEW = 0.8
+
+SENTIMENTS = ['neutral', 'positive', 'negative']
+SENTIMENT_WEIGHTS = [0.6, 0.25, 0.15]
+EMOTIONS = ['neutral', 'joy', 'surprise', 'anger', 'sadness', 'fear', 'disgust']
+EMOTION_WEIGHTS = [0.55, 0.15, 0.1, 0.08, 0.06, 0.03, 0.03]
+ASSOCIATIONS = ['NONE', 'CONTRIBUTOR', 'MEMBER', 'COLLABORATOR', 'OWNER']
+EVENT_TYPES = ['mentioned', 'subscribed', 'closed', 'labeled', 'referenced', 'reopened', 'assigned']
+EXTENSIONS = ['go', 'py', 'md', 'js', 'sol', 'yml']
+VOCABULARY = ('block chain node peer sync state trie gas fee transaction receipt header client consensus '
+              'validator epoch slot fork merge test build release bug fix error panic crash memory leak '
+              'database cache network protocol rpc api request response timeout upgrade config flag log '
+              'metric performance benchmark refactor review comment issue pull commit branch merge rebase').split()
+
+FIRST_DATE = pd.Timestamp('2014-01-01')
+LAST_DATE = pd.Timestamp('2023-09-01')
+
+# Rows generated and written at a time
+GENERATOR_CHUNK_SIZE = 500000
+
+
+def skewed_choice(rng, n, size, exponent):
+    # Zipf-like: the k-th item is drawn with probability proportional to 1 / k^exponent
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.choice(n, size=size, p=weights / weights.sum()) + 1
+
+
+def timestamps(rng, size):
+    span = int((LAST_DATE - FIRST_DATE).total_seconds())
+    seconds = rng.integers(0, span, size)
+    return (FIRST_DATE + pd.to_timedelta(seconds, unit='s')).strftime(CSV_DATETIME_FORMAT)
+
+
+def hex_ids(ids):
+    # 40 hex characters, shaped like the commit and file SHAs of the real dumps
+    return pd.Series(ids).map('{:040x}'.format).values
+
+
+def text(rng, size, min_words, max_words):
+    lengths = rng.integers(min_words, max_words, size)
+    words = np.array(VOCABULARY)[skewed_choice(rng, len(VOCABULARY), lengths.sum(), ITEM_SKEW) - 1]
+    return [' '.join(chunk) for chunk in np.split(words, np.cumsum(lengths)[:-1])]
+
+
+class Generator:
+    def __init__(self, comments, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.rows = {name: max(int(comments * ratio), MIN_ROWS.get(name, 1)) for name, ratio in SCALE_RATIOS.items()}
+        # Issue -> repository, events take the repository of their issue
+        self.issue_repos = skewed_choice(self.rng, self.rows['repositories.csv'], self.rows['issues.csv'], REPO_SKEW)
+
+    def users(self, ids):
+        return pd.DataFrame({
+            'id': ids,
+            'type': np.where(self.rng.random(len(ids)) < 0.97, 'User', 'Bot'),
+            'site_admin': 'false',
+            'name': [f'user{i}' for i in ids],
+        })
+
+    def repositories(self, ids):
+        return pd.DataFrame({
+            'id': ids,
+            'name': [f'repo{i}' for i in ids],
+            'full_name': [f'ethereum/repo{i}' for i in ids],
+            'owner_userfk': 1,
+            'description': text(self.rng, len(ids), 3, 12),
+            'size': self.rng.integers(10, 300000, len(ids)),
+            'created_at': timestamps(self.rng, len(ids)),
+            'updated_at': timestamps(self.rng, len(ids)),
+        })
+
+    def issues(self, ids):
+        size = len(ids)
+        return pd.DataFrame({
+            'id': ids,
+            'number': ids,
+            'user_fk': self.users_of(size),
+            'repo_fk': self.issue_repos[ids - 1],
+            'state': self.rng.choice(['open', 'closed'], size),
+            'locked': 'false',
+            'created_at': timestamps(self.rng, size),
+            'updated_at': timestamps(self.rng, size),
+            'author_association': self.rng.choice(ASSOCIATIONS, size),
+            'title': text(self.rng, size, 3, 10),
+            'comments': self.rng.poisson(8, size),
+            'body': text(self.rng, size, 10, 80),
+        })
+
+    def comments(self, ids):
+        size = len(ids)
+        return pd.DataFrame({
+            'id': ids,
+            'user_fk': self.users_of(size),
+            'issue_fk': skewed_choice(self.rng, self.rows['issues.csv'], size, ITEM_SKEW),
+            'commit_id': None,
+            'created_at': timestamps(self.rng, size),
+            'author_association': self.rng.choice(ASSOCIATIONS, size),
+            'body': text(self.rng, size, 5, 60),
+            'sentiment': self.rng.choice(SENTIMENTS, size, p=SENTIMENT_WEIGHTS),
+            'emotion': self.rng.choice(EMOTIONS, size, p=EMOTION_WEIGHTS),
+        })
+
+    def commits(self, ids):
+        size = len(ids)
+        return pd.DataFrame({
+            'id': hex_ids(ids),
+            'user_fk': self.users_of(size),
+            'repo_fk': skewed_choice(self.rng, self.rows['repositories.csv'], size, REPO_SKEW),
+            'created_at': timestamps(self.rng, size),
+        })
+
+    def events(self, ids):
+        size = len(ids)
+        issues = skewed_choice(self.rng, self.rows['issues.csv'], size, ITEM_SKEW)
+        commits = hex_ids(self.rng.integers(1, self.rows['commits.csv'] + 1, size))
+        return pd.DataFrame({
+            'id': ids,
+            'user_fk': self.users_of(size),
+            'event_type': self.rng.choice(EVENT_TYPES, size),
+            'commit_fk': np.where(self.rng.random(size) < 0.2, commits, None),
+            'created_at': timestamps(self.rng, size),
+            'issue_fk': issues,
+            'repo_fk': self.issue_repos[issues - 1],
+            'total_count': 0,
+        })
+
+    def files(self, ids):
+        size = len(ids)
+        extensions = self.rng.choice(EXTENSIONS, size)
+        return pd.DataFrame({
+            'id': hex_ids(ids),
+            'name': [f'pkg{i % 97}/file{i}.{extension}' for i, extension in zip(ids, extensions)],
+            'repo_fk': skewed_choice(self.rng, self.rows['repositories.csv'], size, REPO_SKEW),
+            'extension_type': extensions,
+        })
+
+    def file_commits(self, ids):
+        size = len(ids)
+        return pd.DataFrame({
+            'id': ids,
+            'commit_fk': hex_ids(self.rng.integers(1, self.rows['commits.csv'] + 1, size)),
+            'user_fk': self.users_of(size),
+            'file_fk': hex_ids(skewed_choice(self.rng, self.rows['files.csv'], size, ITEM_SKEW)),
+            'raw': ['@@ -1,3 +1,4 @@\n+' + line for line in text(self.rng, size, 3, 20)],
+            'child_fk': None,
+        })
+
+    def reactions(self, ids):
+        size = len(ids)
+        counts = {name: self.rng.poisson(rate, size) for name, rate in [
+            ('plus_one', 0.6), ('minus_one', 0.05), ('laugh', 0.1), ('hooray', 0.1),
+            ('confused', 0.05), ('heart', 0.2), ('rocket', 0.1), ('eyes', 0.1)]}
+        return pd.DataFrame({
+            'id': ids,
+            'total_count': sum(counts.values()),
+            **counts,
+            'comment_id': skewed_choice(self.rng, self.rows['comments_with_sent_emo.csv'], size, ITEM_SKEW),
+        })
+
+    def users_of(self, size):
+        return skewed_choice(self.rng, self.rows['users.csv'], size, USER_SKEW)
+
+    def write(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        for file_name, model in FILE_MODEL_MAP.items():
+            make_rows = getattr(self, model.__tablename__)
+            path = os.path.join(out_dir, file_name)
+            total = self.rows[file_name]
+            for start in range(0, total, GENERATOR_CHUNK_SIZE):
+                ids = np.arange(start + 1, min(start + GENERATOR_CHUNK_SIZE, total) + 1)
+                make_rows(ids).to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+            print(f'{file_name}: {total} rows')
+        return self.rows
+
+
+def generate(out_dir, comments, seed=0):
+    return Generator(comments, seed=seed).write(out_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate schema-valid ethereum_go CSVs at a given scale')
+    parser.add_argument('out_dir')
+    parser.add_argument('--comments', type=int, default=10000,
+                        help='number of comments, the other tables are sized relative to it')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.out_dir, args.comments, seed=args.seed)
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ['home.py'] + sorted(os.path.join('pages', name) for name in os.listdir(os.path.join(DASHBOARD_DIR, 'pages'))
+                             if name.endswith('.py') and not name.startswith('_'))
+
+# Budgets in ms per page: import_ms is the time spent importing modules the
+# page pulls in beyond streamlit itself, cold_ms the first run of the page in a
+# fresh interpreter, imports and queries included
+DEFAULT_BUDGET = {'import_ms': 2500, 'cold_ms': 5000}
+PAGE_BUDGETS = {
+    # Nothing beyond the database path until the database has to be built
+    'home.py': {'import_ms': 1000, 'cold_ms': 2500},
+    # openai is only imported once there is a prompt
+    'pages/5_AI_Chatbot.py': {'import_ms': 300, 'cold_ms': 1000},
+}
+# Slowest imports listed per page
+TOP_IMPORTS = 10
+PAGE_TIMEOUT = 300
+
+# Run in a fresh interpreter with import profiling on, as with -X importtime.
+# Streamlit and its test harness are imported first, the marker on stderr
+# separates them from the imports of the page itself. The setting is dropped
+# from the environment right away, so processes the page starts (profile
+# workers, the cache warmup) are not profiled into the same stderr. The timings
+# come back on stdout behind the same marker.
+RUNNER = """
+import json, os, sys, time
+os.environ.pop('PYTHONPROFILEIMPORTTIME')
+from streamlit.testing.v1 import AppTest
+sys.stderr.write('page-startup: start\\n')
+sys.stderr.flush()
+start = time.perf_counter()
+app = AppTest.from_file({page!r}, default_timeout={timeout}).run()
+cold_ms = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+app.run()
+rerun_ms = (time.perf_counter() - start) * 1000
+errors = [str(exception.message) for exception in app.exception]
+print('page-startup:', json.dumps({{'cold_ms': cold_ms, 'rerun_ms': rerun_ms, 'errors': errors}}))
+"""
+
+
+def parse_importtime(stderr):
+    # (module, self_us, cumulative_us, depth) per import after the marker, the
+    # lines -X importtime writes look like
+    # "import time:       123 |        456 |   package.module"
+    imports = []
+    started = False
+    for line in stderr.splitlines():
+        if line == 'page-startup: start':
+            started = True
+        elif started and line.startswith('import time:') and '|' in line:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            if self_us.strip().isdigit():
+                depth = (len(name) - len(name.lstrip()) - 1) // 2
+                imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def bench_page(page, timeout=PAGE_TIMEOUT):
+    result = subprocess.run([sys.executable, '-c', RUNNER.format(page=page, timeout=timeout)],
+                            cwd=DASHBOARD_DIR, env={**os.environ, 'PYTHONPROFILEIMPORTTIME': '1'},
+                            capture_output=True, text=True, timeout=timeout + 60)
+    imports = parse_importtime(result.stderr)
+    # Top level imports only, their cumulative time includes everything below them
+    top_level = sorted((entry for entry in imports if entry[3] == 0), key=lambda entry: entry[2], reverse=True)
+    entry = {
+        'page': page,
+        'import_ms': sum(entry[2] for entry in top_level) / 1000,
+        'modules': len(imports),
+        'top_imports': [{'module': name, 'cumulative_ms': cumulative / 1000}
+                        for name, _, cumulative, _ in top_level[:TOP_IMPORTS]],
+    }
+    # The page may start processes of its own that share stdout
+    output = [line for line in result.stdout.splitlines() if line.startswith('page-startup: ')]
+    if result.returncode == 0 and output:
+        entry.update(json.loads(output[-1][len('page-startup: '):]))
+    else:
+        entry['errors'] = [result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'no output']
+    return entry
+
+
+def over_budget(entry, budgets):
+    budget = {**DEFAULT_BUDGET, **budgets.get(entry['page'], {})}
+    if entry.get('errors'):
+        return [f"{entry['page']}: failed, {entry['errors'][0]}"]
+    return [f"{entry['page']} {metric}: {entry[metric]:.0f} ms, budget {limit} ms"
+            for metric, limit in budget.items() if entry[metric] > limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time and cold start of every dashboard page')
+    parser.add_argument('--pages', nargs='+', default=PAGES, help='page scripts, relative to the dashboard directory')
+    parser.add_argument('--output', default='page_startup.json')
+    parser.add_argument('--budgets', help='JSON file of page -> {"import_ms": ..., "cold_ms": ...}, '
+                                          'merged over the built-in budgets')
+    parser.add_argument('--enforce', action='store_true', help='exit non-zero when a page fails or is over budget')
+    args = parser.parse_args()
+
+    budgets = dict(PAGE_BUDGETS)
+    if args.budgets:
+        with open(args.budgets) as budget_file:
+            budgets.update(json.load(budget_file))
+
+    results = []
+    for page in args.pages:
+        entry = bench_page(page)
+        results.append(entry)
+        if entry.get('errors'):
+            print(f"{page}: failed, {entry['errors'][0]}")
+        else:
+            print(f"{page}: imports {entry['import_ms']:.0f} ms ({entry['modules']} modules), "
+                  f"cold start {entry['cold_ms']:.0f} ms, rerun {entry['rerun_ms']:.0f} ms")
+        for top_import in entry['top_imports']:
+            print(f"    {top_import['cumulative_ms']:8.1f} ms  {top_import['module']}")
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(f'results written to {args.output}')
+
+    failures = [failure for entry in results for failure in over_budget(entry, budgets)]
+    for failure in failures:
+        print(f'OVER BUDGET {failure}')
+    if args.enforce and failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from datetime import date, datetime
+
+DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_MODES = ['bulk', 'stream', 'parallel']
+# Timed calls per query function and cache state, the median is reported
+QUERY_REPEATS = 5
+
+# Sample value for every parameter name the page query functions take
+SAMPLE_QUERIES = {
+    'repo_id': 'SELECT repo_fk FROM repo_activity ORDER BY commit_count + comment_count DESC LIMIT 1',
+    'issue_id': 'SELECT id FROM issues ORDER BY comments DESC LIMIT 1',
+    'committer_id': 'SELECT user_fk FROM commits WHERE user_fk IS NOT NULL '
+                    'GROUP BY user_fk ORDER BY COUNT(*) DESC LIMIT 1',
+}
+SAMPLE_QUERIES['commiter_id'] = SAMPLE_QUERIES['committer_id']
+SAMPLE_QUERIES['user_id'] = ('SELECT user_fk FROM comments WHERE user_fk IS NOT NULL '
+                             'GROUP BY user_fk ORDER BY COUNT(*) DESC LIMIT 1')
+# Activity charts over the whole history of the data
+SAMPLE_QUERIES['start'] = 'SELECT MIN(day) FROM daily_commits'
+SAMPLE_QUERIES['end'] = 'SELECT MAX(day) FROM daily_commits'
+# Sampled days come back as text, the loaders take dates
+DATE_PARAMETERS = ['start', 'end']
+# Parameters sampled as a tuple of every row of the query: the repositories
+# compared, the most active first
+SAMPLE_LIST_QUERIES = {
+    'repo_ids': 'SELECT repo_fk FROM repo_activity ORDER BY commit_count + comment_count DESC LIMIT 5',
+}
+# Parameters that take a fixed value rather than one from the data
+SAMPLE_VALUES = {
+    'activity': 'commit',
+}
+
+
+def timed_import(mode, result_queue):
+    # Runs in a fresh interpreter so ru_maxrss is the peak of this import alone
+    from db_util.db_import import import_db, parallel_import_db
+    start = time.perf_counter()
+    report = parallel_import_db() if mode == 'parallel' else import_db(mode=mode)
+    seconds = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    result_queue.put({'report': report.to_dict('records'), 'seconds': seconds, 'peak_rss_mb': peak_rss_mb})
+
+
+def bench_imports(modes):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for mode in modes:
+        result_queue = context.Queue()
+        process = context.Process(target=timed_import, args=(mode, result_queue))
+        process.start()
+        result = result_queue.get()
+        process.join()
+        rows = sum(entry['rows'] for entry in result['report'])
+        results.append({
+            'mode': mode,
+            'rows': rows,
+            'seconds': result['seconds'],
+            'rows_per_s': rows / result['seconds'],
+            'peak_rss_mb': result['peak_rss_mb'],
+            'tables': result['report'],
+        })
+        print(f"import {mode}: {rows} rows in {result['seconds']:.2f}s, peak {result['peak_rss_mb']:.0f} MB")
+    return results
+
+
+def cached_queries():
+    # The @cached loaders the pages import from db_util.queries
+    from db_util import queries
+    return {name: function for name, function in vars(queries).items()
+            if callable(function) and hasattr(function, 'clear') and hasattr(function, '__wrapped__')}
+
+
+def sample_arguments():
+    from db_util.config import get_engine
+    samples = {}
+    with get_engine().connect() as conn:
+        for name, query in SAMPLE_QUERIES.items():
+            samples[name] = conn.exec_driver_sql(query).scalar()
+        for name, query in SAMPLE_LIST_QUERIES.items():
+            samples[name] = tuple(conn.exec_driver_sql(query).scalars())
+    for name in DATE_PARAMETERS:
+        samples[name] = date.fromisoformat(samples[name])
+    return {**samples, **SAMPLE_VALUES}
+
+
+def time_call(function, args):
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_queries():
+    from db_util.cache import cache_stats
+    from db_util.queries import query_stats
+    samples = sample_arguments()
+    results = []
+    for name, function in cached_queries().items():
+        code = function.__wrapped__.__code__
+        # Parameters with a default keep it
+        parameters = code.co_varnames[:code.co_argcount - len(function.__wrapped__.__defaults__ or ())]
+        args = [samples[parameter] for parameter in parameters]
+        cold, disk, warm = [], [], []
+        for _ in range(QUERY_REPEATS):
+            # Uncached, then from the on-disk cache as after a restart, then from memory
+            cold.append(time_call(function.__wrapped__, args))
+            function(*args)
+            function.clear()
+            disk.append(time_call(function, args))
+            warm.append(time_call(function, args))
+        results.append({
+            'function': name,
+            'args': dict(zip(parameters, args)),
+            'cold_ms': statistics.median(cold),
+            'disk_ms': statistics.median(disk),
+            'warm_ms': statistics.median(warm),
+        })
+        print(f'{name}: cold {results[-1]["cold_ms"]:.2f} ms, disk {results[-1]["disk_ms"]:.2f} ms, '
+              f'warm {results[-1]["warm_ms"]:.2f} ms')
+    return results, query_stats().to_dict('records'), cache_stats()
+
+
+def find_regressions(results, baseline, tolerance):
+    # Anything more than tolerance slower (or, for imports, heavier) than the baseline
+    regressions = []
+    previous_imports = {entry['mode']: entry for entry in baseline.get('imports', [])}
+    for entry in results['imports']:
+        previous = previous_imports.get(entry['mode'])
+        if previous:
+            for metric in ['seconds', 'peak_rss_mb']:
+                if entry[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(f"import {entry['mode']} {metric}: {previous[metric]:.2f} -> {entry[metric]:.2f}")
+    previous_queries = {entry['function']: entry for entry in baseline.get('queries', [])}
+    for entry in results['queries']:
+        previous = previous_queries.get(entry['function'])
+        if previous:
+            for metric in ['cold_ms', 'disk_ms', 'warm_ms']:
+                if metric in previous and entry[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(f"{entry['function']} {metric}: {previous[metric]:.2f} -> {entry[metric]:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark import throughput and page queries on generated data')
+    parser.add_argument('--work-dir', default=os.path.join(DASHBOARD_DIR, 'benchmarks', 'work'),
+                        help='where the generated CSVs and the benchmark database go')
+    parser.add_argument('--comments', type=int, default=10000,
+                        help='scale of the generated data, in comments')
+    parser.add_argument('--data-dir', help='benchmark existing CSVs instead of generating them')
+    parser.add_argument('--modes', nargs='+', choices=IMPORT_MODES, default=IMPORT_MODES)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='results file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative slowdown against the baseline that counts as a regression')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or os.path.join(args.work_dir, f'data_{args.comments}')
+    db_dir = os.path.join(args.work_dir, 'db')
+    os.makedirs(db_dir, exist_ok=True)
+    # Read by db_util when it is first imported, here and in the import processes
+    os.environ['ETHER_DASH_DATA_DIR'] = data_dir
+    os.environ['ETHER_DASH_DB_PATH'] = os.path.join(db_dir, 'ethereum_tool.db')
+    if not args.data_dir and not os.path.exists(data_dir):
+        from benchmarks.generate_data import generate
+        generate(data_dir, args.comments)
+
+    import_results = bench_imports(args.modes)
+    query_results, statement_stats, cache_results = bench_queries()
+    results = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'data_dir': data_dir,
+            'comments': None if args.data_dir else args.comments,
+        },
+        'imports': import_results,
+        'queries': query_results,
+        # Executions per named SQL text, i.e. reuse of the prepared statements
+        'statements': statement_stats,
+        'cache': cache_results,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2, default=str)
+    print(f'results written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = find_regressions(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
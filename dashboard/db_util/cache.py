@@ -0,0 +1,239 @@
+import copy
+import functools
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .config import DB_PATH, db_generation
+
+# Upper bound of the memory held by cached query results, shared by all
+# sessions of the server process
+CACHE_MAX_BYTES = int(os.environ.get('ETHER_DASH_CACHE_MB', 256)) * 1024 * 1024
+# Results persisted as Arrow IPC files next to the database, so a restarted
+# server starts with the results of the previous process and of warm_cache
+QUERY_CACHE_DIR = os.path.join(os.path.dirname(DB_PATH), 'query_cache')
+
+
+def result_size(value):
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        size = value.memory_usage(deep=True)
+        return int(size.sum()) if isinstance(size, pd.Series) else int(size)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    # Least recently used results are evicted once the total size of the
+    # cached results goes over max_bytes. Keys carry the data generation, so a
+    # newly published import is never answered from an older one.
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.generation = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, generation):
+        with self.lock:
+            if generation != self.generation:
+                # Results of the previous generation can never be hit again
+                self.invalidations += len(self.entries)
+                self.entries.clear()
+                self.size = 0
+                self.generation = generation
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, generation, value):
+        size = result_size(value)
+        with self.lock:
+            if generation != self.generation or size > self.max_bytes:
+                return
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self, function_name=None):
+        with self.lock:
+            for key in [key for key in self.entries if function_name is None or key[0] == function_name]:
+                self.size -= self.entries.pop(key)[1]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def plain(value):
+    # numpy scalars picked from DataFrames hash like ints but do not repr like them
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def encode_result(value):
+    # (part, kind, DataFrame) triples, each part is stored as one IPC file
+    if isinstance(value, dict):
+        return [(str(key), kind, frame) for key, item in value.items() for _, kind, frame in encode_result(item)]
+    if isinstance(value, pd.DataFrame):
+        return [('value', 'frame', value)]
+    if isinstance(value, pd.Series):
+        return [('value', 'row', value.to_frame().T.infer_objects())]
+    return [('value', 'scalar', pd.DataFrame({'value': [value]}))]
+
+
+def decode_result(parts):
+    values = {}
+    for part, kind, frame in parts:
+        if kind == 'row':
+            values[part] = frame.iloc[0]
+        elif kind == 'scalar':
+            values[part] = frame.iloc[0, 0]
+        else:
+            values[part] = frame
+    return values['value'] if list(values) == ['value'] else values
+
+
+class DiskCache:
+    # One directory per result, holding one <part>.<kind>.arrow file per frame.
+    # Directories are built aside and renamed into place, readers never see a
+    # partial result. Only the current generation is kept on disk.
+
+    def __init__(self, cache_dir=QUERY_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.generation = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def entry_path(self, key, generation):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, generation, f'{key[0]}-{digest}')
+
+    def get(self, key, generation):
+        # Imported on first use, every page imports this module
+        import pyarrow as pa
+
+        path = self.entry_path(key, generation)
+        try:
+            parts = []
+            for file_name in sorted(os.listdir(path)):
+                part, kind, _ = file_name.rsplit('.', 2)
+                with pa.memory_map(os.path.join(path, file_name)) as source:
+                    parts.append((part, kind, pa.ipc.open_file(source).read_all().to_pandas()))
+        except (FileNotFoundError, pa.ArrowException):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return decode_result(parts)
+
+    def put(self, key, generation, value):
+        import pyarrow as pa
+
+        path = self.entry_path(key, generation)
+        self.prune(generation)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        building = tempfile.mkdtemp(dir=os.path.dirname(path), prefix='.building-')
+        try:
+            for part, kind, frame in encode_result(value):
+                table = pa.Table.from_pandas(frame)
+                with pa.OSFile(os.path.join(building, f'{part}.{kind}.arrow'), 'wb') as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+            os.rename(building, path)
+        except (OSError, pa.ArrowException):
+            # Already cached by another process, or not representable in Arrow:
+            # the result is then only kept in memory
+            shutil.rmtree(building, ignore_errors=True)
+            return
+        with self.lock:
+            self.writes += 1
+
+    def prune(self, generation):
+        with self.lock:
+            if generation == self.generation:
+                return
+            self.generation = generation
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name != generation:
+                    shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def stats(self):
+        with self.lock:
+            return {'disk_hits': self.hits, 'disk_misses': self.misses, 'disk_writes': self.writes}
+
+
+_cache = ResultCache()
+_disk_cache = DiskCache()
+
+
+def cached(function):
+    # Drop-in for @st.cache_data on the query loaders: like it, callers get
+    # their own copy of the result and can modify it. Misses in memory are
+    # looked up on disk before the query runs.
+    name = f'{function.__module__}.{function.__qualname__}'
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        generation = db_generation()
+        key = (name, tuple(map(plain, args)), tuple(sorted((key, plain(value)) for key, value in kwargs.items())))
+        entry = _cache.get(key, generation)
+        if entry is not None:
+            return copy.deepcopy(entry[0])
+        value = _disk_cache.get(key, generation) if generation is not None else None
+        if value is None:
+            value = function(*args, **kwargs)
+            if generation is not None:
+                _disk_cache.put(key, generation, value)
+        _cache.put(key, generation, value)
+        return copy.deepcopy(value)
+
+    wrapper.clear = lambda: _cache.clear(name)
+    return wrapper
+
+
+def cache_stats():
+    return {**_cache.stats(), **_disk_cache.stats()}
+
+
+def clear_cache():
+    # Memory only, the disk entries go with their generation
+    _cache.clear()
@@ -0,0 +1,131 @@
+import copy
+import threading
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from .config import db_generation, get_engine
+
+# Distinct developer x file pairs among the file_commits rows in an id range.
+# file_commits is commit history, so imports only ever append rows to it.
+PAIRS_QUERY = """
+    SELECT DISTINCT user_fk, file_fk
+    FROM file_commits
+    WHERE user_fk IS NOT NULL AND file_fk IS NOT NULL AND id > ? AND id <= ?
+    """
+TABLE_QUERY = 'SELECT COUNT(*), COALESCE(MAX(id), 0) FROM file_commits'
+BELOW_WATERMARK_QUERY = 'SELECT COUNT(*) FROM file_commits WHERE id <= ?'
+# How the last import of file_commits went, see db_import.record_manifest
+MANIFEST_QUERY = "SELECT * FROM import_manifest WHERE table_name = 'file_commits'"
+
+SIMILARITY_METRICS = ['shared_files', 'jaccard', 'cosine']
+
+
+class CollaborationMatrix:
+    # Binary developer x file incidence matrix A in CSR form. Row i of the
+    # co-edit projection A @ A.T holds the number of files developer i shares
+    # with every other developer, it is computed on demand from one sparse row.
+
+    def __init__(self):
+        self.user_index = {}
+        self.file_index = {}
+        self.users = np.empty(0, dtype=np.int64)
+        self.incidence = sp.csr_matrix((0, 0), dtype=np.int32)
+        self.incidence_t = self.incidence.T.tocsr()
+        self.file_counts = np.empty(0, dtype=np.int64)
+        self.watermark = 0
+        self.row_count = 0
+        self.imported_at = None
+
+    @classmethod
+    def load(cls, conn):
+        return cls().refresh(conn)
+
+    def refresh(self, conn):
+        # Returns a new matrix with the rows above the watermark added, this one
+        # keeps serving the pages meanwhile. The matrix is loaded again from
+        # scratch when an import since rewrote stored rows, as reported in the
+        # manifest, or when the row count below the watermark changed (a
+        # trimmed table).
+        manifest = conn.exec_driver_sql(MANIFEST_QUERY).mappings().first() or {}
+        rewritten = manifest.get('imported_at') != self.imported_at and manifest.get('updated_rows') != 0
+        below_watermark = conn.exec_driver_sql(BELOW_WATERMARK_QUERY, (self.watermark,)).scalar()
+        if (self.row_count and rewritten) or below_watermark != self.row_count:
+            return CollaborationMatrix().refresh(conn)
+        matrix = copy.copy(self)
+        matrix.user_index, matrix.file_index = dict(self.user_index), dict(self.file_index)
+        matrix.row_count, matrix.watermark = conn.exec_driver_sql(TABLE_QUERY).one()
+        matrix.imported_at = manifest.get('imported_at')
+        matrix.add_pairs(pd.read_sql(PAIRS_QUERY, conn, params=(self.watermark, matrix.watermark)))
+        return matrix
+
+    def add_pairs(self, pairs):
+        if pairs.empty:
+            return
+        rows = self.indices(self.user_index, pairs['user_fk'])
+        cols = self.indices(self.file_index, pairs['file_fk'])
+        shape = (len(self.user_index), len(self.file_index))
+        added = sp.csr_matrix((np.ones(len(pairs), dtype=np.int32), (rows, cols)), shape=shape)
+        incidence = self.incidence.copy()
+        incidence.resize(shape)
+        # A pair seen before stays a single edge
+        self.incidence = (incidence + added).sign().astype(np.int32).tocsr()
+        self.incidence_t = self.incidence.T.tocsr()
+        self.users = np.array(list(self.user_index), dtype=np.int64)
+        self.file_counts = np.asarray(self.incidence.sum(axis=1)).ravel()
+
+    @staticmethod
+    def indices(index, ids):
+        for value in ids.unique():
+            index.setdefault(value.item() if isinstance(value, np.generic) else value, len(index))
+        return ids.map(index).to_numpy()
+
+    def co_edits(self, user_id):
+        # Shared file counts of user_id with every developer, as a sparse row
+        row = self.user_index.get(user_id)
+        if row is None:
+            return None
+        return self.incidence[row] @ self.incidence_t
+
+    def shared_files(self, user_id, other_id):
+        shared = self.co_edits(user_id)
+        other = self.user_index.get(other_id)
+        return 0 if shared is None or other is None else int(shared[0, other])
+
+    def top_collaborators(self, user_id, k=10, metric='shared_files'):
+        columns = ['user_fk', 'shared_files', 'jaccard', 'cosine']
+        shared = self.co_edits(user_id)
+        if shared is None:
+            return pd.DataFrame(columns=columns)
+        shared = shared.tocoo()
+        others = shared.col != self.user_index[user_id]
+        cols, counts = shared.col[others], shared.data[others].astype(np.float64)
+        own, their = self.file_counts[self.user_index[user_id]], self.file_counts[cols]
+        scores = pd.DataFrame({
+            'user_fk': self.users[cols],
+            'shared_files': counts.astype(np.int64),
+            'jaccard': counts / (own + their - counts),
+            'cosine': counts / np.sqrt(own * their),
+        }, columns=columns)
+        return scores.nlargest(k, [metric, 'shared_files']).reset_index(drop=True)
+
+
+_matrix = None
+_matrix_generation = None
+_matrix_lock = threading.Lock()
+
+
+def get_collaboration_matrix():
+    # Loaded once per process and brought up to date when an import publishes
+    # a new database, by adding the file_commits rows above its watermark or,
+    # when the import rewrote stored rows, by loading it again
+    global _matrix, _matrix_generation
+    generation = db_generation()
+    if _matrix is None or generation != _matrix_generation:
+        with _matrix_lock:
+            if _matrix is None or generation != _matrix_generation:
+                with get_engine().connect() as conn:
+                    _matrix = CollaborationMatrix.load(conn) if _matrix is None else _matrix.refresh(conn)
+                _matrix_generation = generation
+    return _matrix
@@ -1,17 +1,90 @@
-import sqlalchemy
 import os
-import streamlit as st
-import pandas as pd
+import threading
+
+import sqlalchemy
+from sqlalchemy import event
 
 DIR_PATH = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.environ.get('ETHER_DASH_DB_PATH', f'{DIR_PATH}/ethereum_tool.db')
+
+# Pages only read, so every connection is opened read-only and tuned for
+# concurrent readers. Imports never write the live file, they publish a new
+# one by renaming it over the old, see db_import.publish_database.
+READ_PRAGMAS = {
+    'query_only': 'ON',
+    'temp_store': 'MEMORY',
+    # KiB when negative, per connection
+    'cache_size': -16384,
+    # Shared through the OS page cache by all connections and sessions
+    'mmap_size': 268435456,
+}
+
+# Every browser session runs its script in its own thread, size the pool for
+# a burst of concurrent reruns
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+# Prepared statements kept per connection by the sqlite3 driver
+CACHED_STATEMENTS = 256
+
+_engine = None
+_engine_generation = None
+_engine_lock = threading.Lock()
+
+
+def create_read_engine(db_path=DB_PATH):
+    engine = sqlalchemy.create_engine(
+        f'sqlite:///file:{db_path}?mode=ro&uri=true',
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        connect_args={'check_same_thread': False, 'cached_statements': CACHED_STATEMENTS},
+    )
+
+    @event.listens_for(engine, 'connect')
+    def set_read_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in READ_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    return engine
+
+
+def db_generation(db_path=DB_PATH):
+    # Every import publishes a new file, so its inode and mtime identify the
+    # generation of the data. None while no database has been built yet.
+    try:
+        stat = os.stat(db_path)
+    except FileNotFoundError:
+        return None
+    return f'{stat.st_ino}-{stat.st_mtime_ns}'
+
+
+def database_missing():
+    # Until the first import publishes the database, pages stop with a notice
+    # instead of failing on the missing file. Outside of a running app there is
+    # no page to show it on.
+    import streamlit as st
+
+    if st.runtime.exists():
+        st.info("The database is being built, the pages will show data once it is ready. "
+                "The home page reports on the build.")
+        st.stop()
+    raise RuntimeError(f'No database at {DB_PATH}, build it with python -m db_util.db_import')
 
-# Create a connection to your SQLite database
-engine = sqlalchemy.create_engine(f'sqlite:///{DIR_PATH}/ethereum_tool.db')
 
+def get_engine():
+    # One engine per process, shared by all pages, sessions and reruns. Once a new
+    # generation is published the old pool is dropped and the next query reconnects.
+    global _engine, _engine_generation
+    generation = db_generation()
+    if generation is None:
+        database_missing()
+    if _engine is None or generation != _engine_generation:
+        with _engine_lock:
+            if _engine is None or generation != _engine_generation:
+                if _engine is not None:
+                    _engine.dispose()
+                _engine = create_read_engine()
+                _engine_generation = generation
+    return _engine
 
-@st.cache_data
-def load_repositories():
-    # Assuming your repositories table is named 'repositories'
-    with engine.connect() as conn:
-        # Assuming your repositories table is named 'repositories'
-        return pd.read_sql("SELECT id, name FROM repositories ORDER BY name", conn)
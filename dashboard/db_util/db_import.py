@@ -1,18 +1,42 @@
-import pandas as pd
+import argparse
+import functools
+import hashlib
+import multiprocessing
 import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from queue import Empty
 from datetime import datetime
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, Boolean, Integer, TIMESTAMP
 from sqlalchemy.orm import sessionmaker
 
-from .models import Comment, Commit, Event, FileCommit, File, Issue, Reaction, Base, Repository, User
+from .config import db_generation
+from .indexes import build_indexes
+from .rollups import build_rollups, refresh_rollups
+from .search import build_search, refresh_search
+from .snapshots import REPO_JOINS, write_snapshots
+from .terms import build_terms, refresh_terms
+from .models import Comment, Commit, Event, FileCommit, File, Issue, Reaction, Base, Repository, User, \
+    ImportManifest
 
 # from .models import Comment, Commit, Event, FileCommit, File, Issue, Reaction, Base, Repository, User
 
 DIR_PATH = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = f'{DIR_PATH}/ethereum_go'
+# Both can be pointed elsewhere, e.g. at generated data by the benchmarks
+DATA_DIR = os.environ.get('ETHER_DASH_DATA_DIR', f'{DIR_PATH}/ethereum_go')
 DB_NAME = 'ethereum_tool.db'
-DB_PATH = f'{DIR_PATH}/{DB_NAME}'
+DB_PATH = os.environ.get('ETHER_DASH_DB_PATH', f'{DIR_PATH}/{DB_NAME}')
+
+# References an incremental import keeps next to the key of every row it changed,
+# as they were before: the derived data of a repository, issue or user a row
+# moved away from is stale as well
+DELTA_PREVIOUS_COLUMNS = ['repo_fk', 'issue_fk', 'user_fk']
 
 FILE_MODEL_MAP = {
     'users.csv': User,
@@ -26,6 +50,19 @@ FILE_MODEL_MAP = {
     'reactions.csv': Reaction
 }
 
+CSV_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Same text layout SQLAlchemy's SQLite dialect uses when it stores a datetime,
+# so rows written by the bulk loader and by the ORM compare and sort alike.
+DB_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Rows per executemany call, every batch of a table goes through one transaction
+BULK_BATCH_SIZE = 50000
+# Rows read from a CSV at a time by the streaming import
+STREAM_CHUNK_SIZE = 100000
+# Seconds the parallel import's writer waits for a chunk before checking that
+# the parsers are still alive
+QUEUE_POLL_SECONDS = 1
+
 
 def import_csv_to_table(model, filename):
     df = pd.read_csv(f'{DATA_DIR}/{filename}')
@@ -51,21 +88,595 @@ def import_csv_to_table(model, filename):
     return rows
 
 
-def import_db():
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
-    engine = create_engine(f'sqlite:///{DB_PATH}')
-    Base.metadata.create_all(engine, checkfirst=True)
+def convert_frame(model, df):
+    # Column-wise conversion of a raw CSV frame to the values the model's table stores.
+    # Returns only the columns the table knows about, in table order.
+    table = model.__table__
+    columns = [column for column in table.columns if column.name in df.columns]
+    converted = {}
+    for column in columns:
+        values = df[column.name]
+        if isinstance(column.type, TIMESTAMP):
+            values = pd.to_datetime(values, format=CSV_DATETIME_FORMAT, errors='coerce')
+            values = values.dt.strftime(DB_DATETIME_FORMAT)
+        elif isinstance(column.type, Boolean):
+            if values.dtype != bool:
+                values = values.map({True: True, False: False, 'true': True, 'false': False,
+                                     'True': True, 'False': False, 1: True, 0: False})
+        elif isinstance(column.type, Integer):
+            if pd.api.types.is_float_dtype(values):
+                # pandas widens integer columns with gaps to float, narrow them back
+                try:
+                    values = values.astype('Int64')
+                except TypeError:
+                    pass
+        converted[column.name] = values
+    return pd.DataFrame(converted, index=df.index)
+
+
+def frame_to_rows(df):
+    # Plain python tuples with None for missing values, ready for DB-API executemany
+    columns = []
+    for name in df.columns:
+        values = df[name]
+        columns.append(values.astype(object).where(values.notna(), None).tolist())
+    return list(zip(*columns))
+
+
+def insert_statement(model, columns):
+    placeholders = ', '.join('?' for _ in columns)
+    return f"INSERT INTO {model.__tablename__} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+def read_table_frame(model, filename):
+    df = pd.read_csv(f'{DATA_DIR}/{filename}')
+    df = df.drop_duplicates(subset='id', keep='first')
+    return convert_frame(model, df)
+
+
+def write_frame(conn, model, df):
+    statement = insert_statement(model, list(df.columns))
+    for start in range(0, len(df), BULK_BATCH_SIZE):
+        conn.exec_driver_sql(statement, frame_to_rows(df.iloc[start:start + BULK_BATCH_SIZE]))
+    return len(df)
+
+
+def bulk_import_table(engine, model, filename):
+    df = read_table_frame(model, filename)
+    with engine.begin() as conn:
+        return write_frame(conn, model, df)
+
+
+class SeenIds:
+    # Compact set of the ids already written by a streaming import. Integer ids are
+    # kept as they are, other ids as their 64-bit hash, in a few sorted NumPy runs
+    # that are merged like a binary counter so lookups and inserts stay O(log n).
+    def __init__(self):
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs)
+
+    @staticmethod
+    def _keys(ids):
+        if pd.api.types.is_integer_dtype(ids):
+            return ids.to_numpy(dtype=np.int64)
+        return pd.util.hash_pandas_object(ids, index=False).to_numpy()
+
+    def _contains(self, keys):
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self._runs:
+            positions = np.searchsorted(run, keys).clip(max=len(run) - 1)
+            found |= run[positions] == keys
+        return found
+
+    def _add(self, keys):
+        if not len(keys):
+            return
+        self._runs.append(np.sort(keys))
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            last = self._runs.pop()
+            self._runs[-1] = np.sort(np.concatenate([self._runs[-1], last]), kind='mergesort')
+
+    def filter_new(self, ids):
+        # Mask of the rows whose id has not been seen before, in this chunk or earlier ones
+        keys = self._keys(ids)
+        if self._runs and keys.dtype != self._runs[0].dtype:
+            keys = keys.astype(self._runs[0].dtype)
+        new = ~pd.Series(keys).duplicated(keep='first').to_numpy()
+        new &= ~self._contains(keys)
+        self._add(keys[new])
+        return new
+
+
+def stream_import_table(engine, model, filename, chunk_size=STREAM_CHUNK_SIZE):
+    # Peak memory is bounded by chunk_size: each chunk is converted and written
+    # before the next one is read, only the compact id set grows with the file.
+    seen_ids = SeenIds()
+    rows = 0
+    with engine.begin() as conn:
+        for chunk in pd.read_csv(f'{DATA_DIR}/{filename}', chunksize=chunk_size):
+            chunk = chunk[seen_ids.filter_new(chunk['id'])]
+            rows += write_frame(conn, model, convert_frame(model, chunk))
+    return rows
+
+
+def orm_import_table(engine, model, filename):
     Session = sessionmaker(bind=engine)
-    for file_name, model in FILE_MODEL_MAP.items():
-        session = Session()
-        print(file_name)
-        session.add_all(import_csv_to_table(model, file_name))
-        session.commit()
+    session = Session()
+    rows = import_csv_to_table(model, filename)
+    session.add_all(rows)
+    session.commit()
     session.close()
+    return len(rows)
+
+
+IMPORT_MODES = {
+    'bulk': bulk_import_table,
+    'stream': stream_import_table,
+    'orm': orm_import_table,
+}
+
+
+def create_database(db_path):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    engine = create_engine(f'sqlite:///{db_path}')
+    with engine.begin() as conn:
+        # The file is rebuilt from scratch on every import, a crash just means importing again
+        conn.exec_driver_sql('PRAGMA journal_mode=OFF')
+        conn.exec_driver_sql('PRAGMA synchronous=OFF')
+    Base.metadata.create_all(engine, checkfirst=True)
+    return engine
+
+
+def file_fingerprint(filename):
+    path = f'{DATA_DIR}/{filename}'
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_checksum(filename):
+    digest = hashlib.sha256()
+    with open(f'{DATA_DIR}/{filename}', 'rb') as csv_file:
+        for block in iter(lambda: csv_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def table_watermarks(conn, model):
+    # Row count plus the highest integer id and created_at currently stored
+    table = model.__tablename__
+    columns = model.__table__.columns
+    max_id = 'MAX(id)' if isinstance(columns['id'].type, Integer) else 'NULL'
+    max_created_at = 'MAX(created_at)' if 'created_at' in columns else 'NULL'
+    row = conn.exec_driver_sql(f'SELECT COUNT(*), {max_id}, {max_created_at} FROM {table}').one()
+    return {'row_count': row[0], 'max_id': row[1], 'max_created_at': row[2]}
+
+
+def load_manifest(conn):
+    rows = conn.exec_driver_sql(f'SELECT * FROM {ImportManifest.__tablename__}').mappings().all()
+    return {row['file_name']: dict(row) for row in rows}
+
+
+def record_manifest(conn, file_name, model, checksum=None, updated_rows=None):
+    file_size, file_mtime = file_fingerprint(file_name)
+    entry = {
+        'file_name': file_name,
+        'table_name': model.__tablename__,
+        'file_size': file_size,
+        'file_mtime': file_mtime,
+        'checksum': checksum or file_checksum(file_name),
+        'imported_at': datetime.now().strftime(DB_DATETIME_FORMAT),
+        'updated_rows': updated_rows,
+    }
+    entry.update(table_watermarks(conn, model))
+    columns = list(entry)
+    conn.exec_driver_sql(
+        f"INSERT OR REPLACE INTO {ImportManifest.__tablename__} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})",
+        tuple(entry[column] for column in columns))
+
+
+def building_path(db_path):
+    # Builds happen next to the live file, on the same filesystem, so that
+    # publishing them is a single atomic rename
+    fd, path = tempfile.mkstemp(prefix=f'.{os.path.basename(db_path)}.', suffix='.building',
+                                dir=os.path.dirname(db_path))
+    os.close(fd)
+    return path
+
+
+def finish_database(engine, chunk_size=STREAM_CHUNK_SIZE):
+    # Steps that run once all tables are loaded
+    with engine.begin() as conn:
+        for file_name, model in FILE_MODEL_MAP.items():
+            record_manifest(conn, file_name, model)
+        build_indexes(conn)
+        build_rollups(conn)
+        build_terms(conn, chunk_size)
+        build_search(conn)
+
+
+def validate_database(engine, expected_rows):
+    # Refuses to publish a build whose tables do not hold the rows the import wrote
+    with engine.connect() as conn:
+        for table, rows in expected_rows.items():
+            stored = conn.exec_driver_sql(f'SELECT COUNT(*) FROM {table}').scalar()
+            if stored != rows:
+                raise RuntimeError(f'{table} holds {stored} rows after the import, expected {rows}')
+
+
+def publish_database(engine, build_path, db_path, expected_rows, snapshot_tables=None):
+    # The live file is never written to: pages keep reading the previous generation
+    # until the finished build is renamed over it, and reconnect on their next query.
+    # The Parquet snapshots of the new generation follow, snapshot_tables limits
+    # the ones rewritten, the others are carried over from the previous generation.
+    try:
+        validate_database(engine, expected_rows)
+    finally:
+        engine.dispose()
+    previous_generation = db_generation(db_path)
+    # The build is written without syncs, so it is flushed once here. The
+    # directory is flushed after the rename, or a crash could bring back the
+    # old entry or a truncated file under db_path.
+    sync_path(build_path)
+    os.replace(build_path, db_path)
+    sync_path(os.path.dirname(os.path.abspath(db_path)))
+    write_snapshots(db_path, tables=snapshot_tables, previous_generation=previous_generation)
+
+
+def sync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def remove_build(build_path):
+    if os.path.exists(build_path):
+        os.remove(build_path)
+
+
+def import_db(mode='bulk', db_path=DB_PATH, chunk_size=STREAM_CHUNK_SIZE):
+    import_table = IMPORT_MODES[mode]
+    if mode == 'stream':
+        import_table = functools.partial(import_table, chunk_size=chunk_size)
+    build_path = building_path(db_path)
+    try:
+        engine = create_database(build_path)
+        report = []
+        for file_name, model in FILE_MODEL_MAP.items():
+            print(file_name)
+            start = time.perf_counter()
+            rows = import_table(engine, model, file_name)
+            seconds = time.perf_counter() - start
+            report.append({
+                'table': model.__tablename__,
+                'rows': rows,
+                'seconds': seconds,
+                'rows_per_s': rows / seconds if seconds else float('inf'),
+            })
+        finish_database(engine, chunk_size)
+        publish_database(engine, build_path, db_path, {entry['table']: entry['rows'] for entry in report})
+    finally:
+        remove_build(build_path)
+    return pd.DataFrame(report)
+
+
+def file_changed(manifest_entry, filename):
+    # Size and mtime are enough to skip untouched files, the checksum settles the rest
+    if manifest_entry is None:
+        return True, file_checksum(filename)
+    if (manifest_entry['file_size'], manifest_entry['file_mtime']) == file_fingerprint(filename):
+        return False, manifest_entry['checksum']
+    checksum = file_checksum(filename)
+    return checksum != manifest_entry['checksum'], checksum
+
+
+def delta_columns(model):
+    table = model.__table__
+    key = table.primary_key.columns.keys()[0]
+    return [key] + [column for column in DELTA_PREVIOUS_COLUMNS if column in table.columns]
+
+
+def create_delta_tables(conn):
+    # temp.delta_<table> collects the primary keys of every row an incremental import
+    # inserted or changed, so derived data can be refreshed for just those rows
+    for model in FILE_MODEL_MAP.values():
+        table = model.__tablename__
+        conn.exec_driver_sql(f'CREATE TEMP TABLE IF NOT EXISTS delta_{table} AS '
+                             f"SELECT {', '.join(delta_columns(model))} FROM main.{table} LIMIT 0")
+
+
+def upsert_frame(conn, model, df):
+    # Stages the chunk in a temp table, records which keys are new or differ from
+    # the stored row, then upserts only those rows keyed on the model's primary key.
+    # Returns the number of rows written and how many of them were inserted.
+    table = model.__tablename__
+    columns = list(df.columns)
+    key = model.__table__.primary_key.columns.keys()[0]
+    values = [column for column in columns if column != key]
+    column_list = ', '.join(columns)
+    staging = f'temp.staging_{table}'
+    conn.exec_driver_sql(f'DROP TABLE IF EXISTS {staging}')
+    conn.exec_driver_sql(f'CREATE TEMP TABLE staging_{table} AS SELECT {column_list} FROM main.{table} LIMIT 0')
+    conn.exec_driver_sql(
+        f"INSERT INTO {staging} ({column_list}) VALUES ({', '.join('?' for _ in columns)})",
+        frame_to_rows(df))
+    inserted = conn.exec_driver_sql(
+        f'SELECT COUNT(*) FROM {staging} AS s LEFT JOIN main.{table} AS m ON m.{key} = s.{key} '
+        f'WHERE m.{key} IS NULL').scalar()
+    stored = ', '.join(f'm.{column}' for column in values)
+    staged = ', '.join(f's.{column}' for column in values)
+    differs = f' OR ({stored}) IS NOT ({staged})' if values else ''
+    # Read before the upsert overwrites them: the stored row's references, NULL for a new row
+    previous = ''.join(f', m.{column}' for column in delta_columns(model)[1:])
+    conn.exec_driver_sql(
+        f"INSERT INTO temp.delta_{table} ({', '.join(delta_columns(model))}) "
+        f'SELECT s.{key}{previous} FROM {staging} AS s LEFT JOIN main.{table} AS m ON m.{key} = s.{key} '
+        f'WHERE m.{key} IS NULL{differs}')
+    if values:
+        update = ', '.join(f'{column} = excluded.{column}' for column in values)
+        current = ', '.join(f'{table}.{column}' for column in values)
+        incoming = ', '.join(f'excluded.{column}' for column in values)
+        conflict = f'DO UPDATE SET {update} WHERE ({current}) IS NOT ({incoming})'
+    else:
+        conflict = 'DO NOTHING'
+    changed = conn.exec_driver_sql(
+        f'INSERT INTO main.{table} ({column_list}) SELECT {column_list} FROM {staging} WHERE true '
+        f'ON CONFLICT ({key}) {conflict}').rowcount
+    conn.exec_driver_sql(f'DROP TABLE {staging}')
+    return changed, inserted
+
+
+def upsert_table(conn, model, filename, chunk_size=STREAM_CHUNK_SIZE):
+    seen_ids = SeenIds()
+    rows = changed = inserted = 0
+    for chunk in pd.read_csv(f'{DATA_DIR}/{filename}', chunksize=chunk_size):
+        chunk = chunk[seen_ids.filter_new(chunk['id'])]
+        rows += len(chunk)
+        chunk_changed, chunk_inserted = upsert_frame(conn, model, convert_frame(model, chunk))
+        changed += chunk_changed
+        inserted += chunk_inserted
+    return rows, changed, inserted
+
+
+def new_rows_since(conn, model, max_id):
+    if max_id is None or not isinstance(model.__table__.columns['id'].type, Integer):
+        return None
+    return conn.exec_driver_sql(f'SELECT COUNT(*) FROM {model.__tablename__} WHERE id > ?', (max_id,)).scalar()
+
+
+def changed_files(db_path):
+    engine = create_engine(f'sqlite:///file:{db_path}?mode=ro&uri=true')
+    with engine.connect() as conn:
+        manifest = load_manifest(conn) if inspect(conn).has_table(ImportManifest.__tablename__) else {}
+    engine.dispose()
+    changes = {}
+    for file_name in FILE_MODEL_MAP:
+        changed_file, checksum = file_changed(manifest.get(file_name), file_name)
+        if changed_file:
+            changes[file_name] = checksum
+    return manifest, changes
+
+
+def update_db(db_path=DB_PATH, chunk_size=STREAM_CHUNK_SIZE):
+    # Incremental refresh: files whose checksum matches the manifest are skipped, the
+    # others are applied as upserts to a copy of the live database that is then
+    # published like a full build. Rows deleted from a CSV stay in the database,
+    # run a full import_db to drop them.
+    if not os.path.exists(db_path):
+        return import_db(mode='stream', db_path=db_path, chunk_size=chunk_size)
+    manifest, changes = changed_files(db_path)
+    report = [{'table': model.__tablename__, 'skipped': file_name not in changes, 'rows': 0, 'changed': 0,
+               'inserted': 0, 'new_since_watermark': 0, 'seconds': 0.0}
+              for file_name, model in FILE_MODEL_MAP.items()]
+    if not changes:
+        return pd.DataFrame(report)
+    build_path = building_path(db_path)
+    try:
+        # Nothing but the import writes the live file, so a plain copy is consistent
+        shutil.copyfile(db_path, build_path)
+        engine = create_engine(f'sqlite:///{build_path}')
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            # Published files must not depend on -wal/-shm sidecars, which are named
+            # after the path and would outlive the rename
+            conn.exec_driver_sql('PRAGMA journal_mode=DELETE')
+        Base.metadata.create_all(engine, checkfirst=True)
+        with engine.begin() as conn:
+            # Manifests written before updated_rows was recorded
+            manifest_columns = {column['name'] for column in inspect(conn).get_columns(ImportManifest.__tablename__)}
+            if 'updated_rows' not in manifest_columns:
+                conn.exec_driver_sql(f'ALTER TABLE {ImportManifest.__tablename__} ADD COLUMN updated_rows INTEGER')
+            build_indexes(conn, analyze=False)
+            create_delta_tables(conn)
+            for entry, (file_name, model) in zip(report, FILE_MODEL_MAP.items()):
+                if file_name not in changes:
+                    continue
+                print(file_name)
+                start = time.perf_counter()
+                entry['rows'], entry['changed'], entry['inserted'] = upsert_table(
+                    conn, model, file_name, chunk_size=chunk_size)
+                record_manifest(conn, file_name, model, checksum=changes[file_name],
+                                updated_rows=entry['changed'] - entry['inserted'])
+                entry['new_since_watermark'] = new_rows_since(conn, model, (manifest.get(file_name) or {}).get('max_id'))
+                entry['seconds'] = time.perf_counter() - start
+            if any(entry['changed'] for entry in report):
+                refresh_rollups(conn)
+                refresh_terms(conn, chunk_size)
+                refresh_search(conn)
+                # Re-runs ANALYZE only for tables whose statistics drifted
+                conn.exec_driver_sql('PRAGMA optimize')
+        # Upserts never delete, every table holds its previous rows plus the inserted ones
+        expected_rows = {}
+        for entry, (file_name, model) in zip(report, FILE_MODEL_MAP.items()):
+            if file_name in manifest:
+                expected_rows[entry['table']] = manifest[file_name]['row_count'] + entry['inserted']
+        changed_tables = {entry['table'] for entry in report if entry['changed']}
+        # Snapshots that borrow repo_fk from a changed parent table are stale as well
+        changed_tables |= {table for table, (parent, _) in REPO_JOINS.items() if parent in changed_tables}
+        publish_database(engine, build_path, db_path, expected_rows, snapshot_tables=changed_tables)
+    finally:
+        remove_build(build_path)
+    return pd.DataFrame(report)
+
+
+# Set in each parser process of the parallel import by init_parser
+_chunk_queue = None
+_stop_parsing = None
+
+
+def init_parser(chunk_queue, stop_parsing):
+    # Process pool initializer: the queue and event are inherited when the worker
+    # starts, chunks then go through a pipe straight to the writer
+    global _chunk_queue, _stop_parsing
+    _chunk_queue, _stop_parsing = chunk_queue, stop_parsing
+
+
+def parse_file_chunks(file_name, chunk_size):
+    # Process pool worker: parses and converts one CSV and hands the writer ready
+    # executemany rows through the bounded queue, a (file_name, None) item marks
+    # the end. Stops early once the writer has failed.
+    model = FILE_MODEL_MAP[file_name]
+    seen_ids = SeenIds()
+    start = time.perf_counter()
+    try:
+        for chunk in pd.read_csv(f'{DATA_DIR}/{file_name}', chunksize=chunk_size):
+            if _stop_parsing.is_set():
+                break
+            chunk = convert_frame(model, chunk[seen_ids.filter_new(chunk['id'])])
+            _chunk_queue.put((file_name, list(chunk.columns), frame_to_rows(chunk)))
+    finally:
+        _chunk_queue.put((file_name, None, None))
+    return time.perf_counter() - start
+
+
+def next_chunk(chunk_queue, futures):
+    # The next queue item. Raises the error of a parser that failed as soon as it
+    # is known, without writing the chunks the others keep sending or waiting for
+    # an item a dead parser will never send.
+    while True:
+        for future in futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        try:
+            return chunk_queue.get(timeout=QUEUE_POLL_SECONDS)
+        except Empty:
+            pass
+
+
+def stop_parsers(chunk_queue, stop_parsing, futures, pending):
+    # After a failure: parsers that have not started are cancelled, the others
+    # stop after their current chunk. The queue is drained until each of them has
+    # sent its end marker, a parser blocked on a full queue, or with data still
+    # in its pipe, would otherwise keep the pool from shutting down.
+    stop_parsing.set()
+    pending -= sum(future.cancel() for future in futures)
+    while pending:
+        try:
+            _, columns, _ = chunk_queue.get(timeout=QUEUE_POLL_SECONDS)
+        except Empty:
+            # A dead parser breaks the pool, which then stops all the others
+            if any(future.done() and not future.cancelled() and isinstance(future.exception(), BrokenProcessPool)
+                   for future in futures):
+                return
+            continue
+        if columns is None:
+            pending -= 1
+
+
+def parallel_import_db(db_path=DB_PATH, workers=None, chunk_size=STREAM_CHUNK_SIZE, queue_size=8):
+    # Parsing runs in a process pool, largest files first, while this process is the
+    # only SQLite writer. The queue bound keeps at most queue_size chunks in flight.
+    # Worth it once parsing and converting the CSVs takes longer than writing
+    # them, with hundreds of thousands of rows and several CPUs: every row is
+    # pickled once more on its way to the writer, on small dumps bulk is faster.
+    file_names = sorted(FILE_MODEL_MAP, key=lambda name: file_fingerprint(name)[0], reverse=True)
+    stats = {name: {'table': FILE_MODEL_MAP[name].__tablename__, 'rows': 0, 'parse_s': 0.0, 'write_s': 0.0}
+             for name in FILE_MODEL_MAP}
+    build_path = building_path(db_path)
+    try:
+        engine = create_database(build_path)
+        start = time.perf_counter()
+        chunk_queue = multiprocessing.Queue(maxsize=queue_size)
+        stop_parsing = multiprocessing.Event()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_parser,
+                                 initargs=(chunk_queue, stop_parsing)) as pool:
+            futures = {pool.submit(parse_file_chunks, name, chunk_size): name for name in file_names}
+            pending = len(futures)
+            wait_s = 0.0
+            try:
+                with engine.begin() as conn:
+                    while pending:
+                        wait_start = time.perf_counter()
+                        file_name, columns, rows = next_chunk(chunk_queue, futures)
+                        wait_s += time.perf_counter() - wait_start
+                        if columns is None:
+                            pending -= 1
+                            continue
+                        write_start = time.perf_counter()
+                        model = FILE_MODEL_MAP[file_name]
+                        conn.exec_driver_sql(insert_statement(model, columns), rows)
+                        stats[file_name]['rows'] += len(rows)
+                        stats[file_name]['write_s'] += time.perf_counter() - write_start
+            except BaseException:
+                stop_parsers(chunk_queue, stop_parsing, futures, pending)
+                raise
+            for future, file_name in futures.items():
+                stats[file_name]['parse_s'] = future.result()
+        total_s = time.perf_counter() - start
+        finish_start = time.perf_counter()
+        finish_database(engine, chunk_size)
+        publish_database(engine, build_path, db_path, {entry['table']: entry['rows'] for entry in stats.values()})
+    finally:
+        remove_build(build_path)
+    report = pd.DataFrame(list(stats.values()))
+    print(f'wall clock {total_s:.2f}s, finishing (manifest, indexes, rollups, terms, search, snapshots) '
+          f'{time.perf_counter() - finish_start:.2f}s, writer busy {report.write_s.sum():.2f}s, '
+          f'writer waiting on parsers {wait_s:.2f}s, workers {workers or os.cpu_count()}')
+    return report
+
+
+def compare_import_modes():
+    # Runs the ORM path into a scratch file and the bulk path into the real DB
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        orm_report = import_db(mode='orm', db_path=os.path.join(tmp_dir, DB_NAME))
+    bulk_report = import_db(mode='bulk')
+    report = pd.merge(orm_report, bulk_report, on=['table', 'rows'], suffixes=('_orm', '_bulk'))
+    report['speedup'] = report['rows_per_s_bulk'] / report['rows_per_s_orm']
+    return report
+
+
+def print_report(report):
+    with pd.option_context('display.float_format', '{:,.2f}'.format, 'display.width', 200):
+        print(report.to_string(index=False))
 
 
 if __name__ == '__main__':
-    import_db()
+    parser = argparse.ArgumentParser(description='Import the ethereum_go CSV dumps into SQLite')
+    parser.add_argument('--mode', choices=sorted(IMPORT_MODES), default='bulk')
+    parser.add_argument('--compare', action='store_true',
+                        help='import with both the ORM and the bulk path and report the speedup per table')
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE,
+                        help='rows per CSV chunk in stream, parallel and incremental mode, also sets '
+                             'how many comments are tokenized at a time')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only re-import CSVs that changed since the last import, as upserts')
+    parser.add_argument('--parallel', action='store_true',
+                        help='parse CSVs in a process pool that feeds a single SQLite writer, '
+                             'faster than bulk on large dumps only')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='parser processes for --parallel, defaults to the number of CPUs')
+    args = parser.parse_args()
+    if args.compare:
+        print_report(compare_import_modes())
+    elif args.incremental:
+        print_report(update_db(chunk_size=args.chunk_size))
+    elif args.parallel:
+        print_report(parallel_import_db(workers=args.workers, chunk_size=args.chunk_size))
+    else:
+        print_report(import_db(mode=args.mode, chunk_size=args.chunk_size))
     # comments_df = pd.read_csv(f'{DATA_DIR}/comments_with_sent_emo.csv', quotechar='"')
-    # print(comments_df.head(10))
\ No newline at end of file
+    # print(comments_df.head(10))
@@ -0,0 +1,47 @@
+# Secondary indexes for the filters and joins the pages run. They are created
+# after the tables are loaded, building them once is much cheaper than keeping
+# them up to date row by row during the import.
+QUERY_INDEXES = {
+    # 1_commits: per-repo daily counts and distinct committers,
+    # 4_collaboration: committers per repo
+    'ix_commits_repo_fk_created_at': ('commits', ('repo_fk', 'created_at')),
+    'ix_commits_repo_fk_user_fk': ('commits', ('repo_fk', 'user_fk')),
+    # 4_collaboration: commits of a committer
+    'ix_commits_user_fk': ('commits', ('user_fk',)),
+    # 3_issues: issues of a repo ordered by comment count, a page at a time
+    'ix_issues_repo_fk_comments_or_zero': ('issues', ('repo_fk', 'COALESCE(comments, 0)')),
+    # 2_comments: issues opened per user in a repo
+    'ix_issues_repo_fk_user_fk': ('issues', ('repo_fk', 'user_fk')),
+    # 2_comments and 3_issues: issues joined to their comments, ordered by date
+    'ix_comments_issue_fk_created_at': ('comments', ('issue_fk', 'created_at')),
+    # 4_collaboration: comments written by a user
+    'ix_comments_user_fk': ('comments', ('user_fk',)),
+    # 3_issues: reactions of an issue's comments
+    'ix_reactions_comment_id': ('reactions', ('comment_id',)),
+    # 3_issues: events of an issue
+    'ix_events_issue_fk': ('events', ('issue_fk',)),
+    # 4_collaboration: files touched by a committer and the other committers of a file
+    'ix_file_commits_user_fk_file_fk': ('file_commits', ('user_fk', 'file_fk')),
+    'ix_file_commits_file_fk_user_fk': ('file_commits', ('file_fk', 'user_fk')),
+    # 4_collaboration: committers of a repo by commit count, a page at a time,
+    # and users by name prefix
+    'ix_repo_committers_repo_fk_commit_count_user_fk': ('repo_committers', ('repo_fk', 'commit_count', 'user_fk')),
+    'ix_users_name': ('users', ('name COLLATE NOCASE',)),
+    # 2_comments, 3_issues and 4_collaboration: comment label counts of a repo, issue or user.
+    # 6_comparison sums the sentiment counts of several repos from the first index alone.
+    'ix_comment_labels_repo_fk_sentiment_count': ('comment_labels', ('repo_fk', 'sentiment', 'count')),
+    'ix_comment_labels_issue_fk': ('comment_labels', ('issue_fk',)),
+    'ix_comment_labels_user_fk': ('comment_labels', ('user_fk',)),
+}
+# Replaced by one of the above, dropped from databases an older import built
+RETIRED_INDEXES = ['ix_issues_repo_fk_comments']
+
+
+def build_indexes(conn, analyze=True):
+    for name in RETIRED_INDEXES:
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+    for name, (table, columns) in QUERY_INDEXES.items():
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+    if analyze:
+        # Refresh the planner statistics so it picks the indexes above
+        conn.exec_driver_sql('ANALYZE')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, TIMESTAMP, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, TIMESTAMP, ForeignKey, Text, Date
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -115,3 +115,76 @@ class Event(Base):
     issue_fk = Column(Integer, ForeignKey('issues.id'))
     repo_fk = Column(Integer, ForeignKey('repositories.id'))
     total_count = Column(Integer)
+
+
+class ImportManifest(Base):
+    __tablename__ = 'import_manifest'
+    file_name = Column(String, primary_key=True)
+    table_name = Column(String)
+    file_size = Column(Integer)
+    file_mtime = Column(Integer)
+    checksum = Column(String)
+    row_count = Column(Integer)
+    max_id = Column(Integer)
+    max_created_at = Column(TIMESTAMP)
+    imported_at = Column(TIMESTAMP)
+    # Stored rows the import rewrote, NULL after a full import that may have rewritten any
+    updated_rows = Column(Integer)
+
+
+# Rollups built by the import from the tables above, see rollups.py
+class DailyCommits(Base):
+    __tablename__ = 'daily_commits'
+    repo_fk = Column(Integer, ForeignKey('repositories.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer)
+
+
+class DailyComments(Base):
+    __tablename__ = 'daily_comments'
+    repo_fk = Column(Integer, ForeignKey('repositories.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer)
+
+
+class RepoCommitters(Base):
+    __tablename__ = 'repo_committers'
+    repo_fk = Column(Integer, ForeignKey('repositories.id'), primary_key=True)
+    user_fk = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    commit_count = Column(Integer)
+
+
+class RepoActivity(Base):
+    __tablename__ = 'repo_activity'
+    repo_fk = Column(Integer, ForeignKey('repositories.id'), primary_key=True)
+    commit_count = Column(Integer)
+    committer_count = Column(Integer)
+    comment_count = Column(Integer)
+    commenter_count = Column(Integer)
+
+
+class UserTerms(Base):
+    __tablename__ = 'user_terms'
+    user_fk = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    term = Column(String, primary_key=True)
+    count = Column(Integer)
+
+
+class IssueTerms(Base):
+    __tablename__ = 'issue_terms'
+    issue_fk = Column(Integer, ForeignKey('issues.id'), primary_key=True)
+    term = Column(String, primary_key=True)
+    count = Column(Integer)
+
+
+# Comments counted per repository, issue, author, sentiment and emotion. Labels
+# can be NULL, so the cells get a surrogate key.
+class CommentLabels(Base):
+    __tablename__ = 'comment_labels'
+    id = Column(Integer, primary_key=True)
+    repo_fk = Column(Integer, ForeignKey('repositories.id'))
+    issue_fk = Column(Integer, ForeignKey('issues.id'))
+    user_fk = Column(Integer, ForeignKey('users.id'))
+    sentiment = Column(String)
+    emotion = Column(String)
+    count = Column(Integer)
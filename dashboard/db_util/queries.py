@@ -0,0 +1,570 @@
+import json
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event, text
+
+from .cache import cached
+from .config import get_engine
+from .search import match_expression
+
+# First day of the bucket a day of a daily rollup falls in: the day itself, the
+# Monday of its week, the first of its month or of its year
+BUCKET_START = """
+    CASE :bucket
+        WHEN 'week' THEN DATE(day, '-6 days', 'weekday 1')
+        WHEN 'month' THEN strftime('%Y-%m-01', day)
+        WHEN 'year' THEN strftime('%Y-01-01', day)
+        ELSE day
+    END"""
+
+# Every query the pages run, by name. Values are bound as parameters, so each
+# query is one fixed SQL text: SQLAlchemy compiles it once and the sqlite3
+# driver keeps it prepared in its per-connection statement cache
+# (config.CACHED_STATEMENTS), whatever repo, issue or user it is run for.
+QUERIES = {name: text(sql) for name, sql in {
+    'repositories': """
+        SELECT id, name
+        FROM repositories
+        ORDER BY name
+        """,
+    'commits_by_repo': """
+        SELECT day as date, count as commit_count
+        FROM daily_commits
+        WHERE repo_fk = :repo_id
+        ORDER BY day DESC
+        """,
+    # Activity charts: the days a repository's rollups span, then the counts
+    # between two days in buckets, with the total of the window just before
+    'activity_days': """
+        SELECT 'commit' AS activity, MIN(day) AS first_day, MAX(day) AS last_day
+        FROM daily_commits
+        WHERE repo_fk = :repo_id
+        UNION ALL
+        SELECT 'comment', MIN(day), MAX(day)
+        FROM daily_comments
+        WHERE repo_fk = :repo_id
+        """,
+    'commit_activity': f"""
+        SELECT 'bucket' AS kind, {BUCKET_START} AS date, SUM(count) AS count
+        FROM daily_commits
+        WHERE repo_fk = :repo_id AND day BETWEEN :start AND :end
+        GROUP BY 2
+        UNION ALL
+        SELECT 'previous', NULL, SUM(count)
+        FROM daily_commits
+        WHERE repo_fk = :repo_id AND day BETWEEN :previous_start AND :previous_end
+        """,
+    'comment_activity': f"""
+        SELECT 'bucket' AS kind, {BUCKET_START} AS date, SUM(count) AS count
+        FROM daily_comments
+        WHERE repo_fk = :repo_id AND day BETWEEN :start AND :end
+        GROUP BY 2
+        UNION ALL
+        SELECT 'previous', NULL, SUM(count)
+        FROM daily_comments
+        WHERE repo_fk = :repo_id AND day BETWEEN :previous_start AND :previous_end
+        """,
+    # Comparison page: the same rollups for several repositories at once, grouped
+    # by repository. :repo_ids is a JSON array of ids, so the SQL text stays the
+    # same whatever the number of repositories.
+    'comparison_summary': """
+        WITH days AS (
+            SELECT day FROM daily_commits WHERE repo_fk IN (SELECT value FROM json_each(:repo_ids))
+            UNION ALL
+            SELECT day FROM daily_comments WHERE repo_fk IN (SELECT value FROM json_each(:repo_ids))
+        )
+        SELECT 'totals' AS kind, repo_fk, NULL AS label,
+               commit_count, committer_count, comment_count, commenter_count
+        FROM repo_activity
+        WHERE repo_fk IN (SELECT value FROM json_each(:repo_ids))
+        UNION ALL
+        SELECT 'sentiment', repo_fk, sentiment, NULL, NULL, SUM(count), NULL
+        FROM comment_labels
+        WHERE repo_fk IN (SELECT value FROM json_each(:repo_ids))
+        GROUP BY repo_fk, sentiment
+        UNION ALL
+        SELECT 'first_day', NULL, MIN(day), NULL, NULL, NULL, NULL
+        FROM days
+        UNION ALL
+        SELECT 'last_day', NULL, MAX(day), NULL, NULL, NULL, NULL
+        FROM days
+        """,
+    'comparison_activity': f"""
+        SELECT 'commit' AS activity, repo_fk, {BUCKET_START} AS date, SUM(count) AS count
+        FROM daily_commits
+        WHERE repo_fk IN (SELECT value FROM json_each(:repo_ids)) AND day BETWEEN :start AND :end
+        GROUP BY repo_fk, 3
+        UNION ALL
+        SELECT 'comment', repo_fk, {BUCKET_START}, SUM(count)
+        FROM daily_comments
+        WHERE repo_fk IN (SELECT value FROM json_each(:repo_ids)) AND day BETWEEN :start AND :end
+        GROUP BY repo_fk, 3
+        """,
+    'committers_count': """
+        SELECT committer_count as dev_count
+        FROM repo_activity
+        WHERE repo_fk = :repo_id
+        """,
+    # Pickers read one page at a time, seeking past the sort key of the last
+    # row of the previous page in an index instead of skipping rows
+    # Issues without a comment count sort as uncommented, a NULL in the row
+    # value would drop them from every page. The plain bound on the count lets
+    # the index seek to the cursor.
+    'issue_page': """
+        SELECT id, number, title, COALESCE(comments, 0) AS comments
+        FROM issues
+        WHERE repo_fk = :repo_id AND COALESCE(comments, 0) <= :after_comments
+            AND (COALESCE(comments, 0), id) < (:after_comments, :after_id)
+        ORDER BY COALESCE(comments, 0) DESC, id DESC
+        LIMIT :limit
+        """,
+    'issue': """
+        SELECT *
+        FROM issues
+        WHERE id = :issue_id
+        """,
+    'comments_by_issue': """
+        SELECT c.id, c.user_fk, c.created_at
+        FROM comments AS c
+        WHERE c.issue_fk = :issue_id
+        GROUP BY DATE(c.created_at)
+        ORDER BY c.created_at DESC
+        """,
+    'reactions_by_issue': """
+        SELECT r.*
+        FROM reactions AS r, comments AS c
+        WHERE c.issue_fk = :issue_id AND r.comment_id = c.id
+        ORDER BY r.created_at DESC
+        """,
+    'events_by_issue': """
+        SELECT *
+        FROM events
+        WHERE issue_fk = :issue_id
+        """,
+    'committer_page': """
+        SELECT rc.user_fk, COALESCE(u.name, '') AS name, rc.commit_count
+        FROM repo_committers AS rc LEFT JOIN users AS u ON u.id = rc.user_fk
+        WHERE rc.repo_fk = :repo_id AND (rc.commit_count, rc.user_fk) < (:after_count, :after_user)
+        ORDER BY rc.commit_count DESC, rc.user_fk DESC
+        LIMIT :limit
+        """,
+    'committer_page_by_name': """
+        SELECT rc.user_fk, u.name, rc.commit_count
+        FROM users AS u, repo_committers AS rc
+        WHERE u.name >= :prefix COLLATE NOCASE AND u.name < :prefix_end COLLATE NOCASE
+          AND (u.name COLLATE NOCASE, u.id) > (:after_name, :after_user)
+          AND rc.repo_fk = :repo_id AND rc.user_fk = u.id
+        ORDER BY u.name COLLATE NOCASE, u.id
+        LIMIT :limit
+        """,
+    'commits_by_committer': """
+        SELECT *
+        FROM commits
+        WHERE user_fk = :committer_id
+        """,
+    'files_by_committer': """
+        SELECT fc.user_fk, f.name, f.id
+        FROM file_commits AS fc, files AS f
+        WHERE f.id = fc.file_fk AND fc.user_fk = :committer_id
+        GROUP BY fc.user_fk, fc.file_fk
+        """,
+    # The other committers of every file a committer touched, in one statement
+    'co_committers': """
+        SELECT DISTINCT fc.file_fk, fc.user_fk
+        FROM file_commits AS fc
+        WHERE fc.file_fk IN (SELECT file_fk FROM file_commits WHERE user_fk = :committer_id)
+          AND fc.user_fk <> :committer_id
+        """,
+    'comments_by_user': """
+        SELECT body, sentiment, emotion
+        FROM comments
+        WHERE user_fk = :user_id
+        """,
+    'terms_by_user': """
+        SELECT term, count
+        FROM user_terms
+        WHERE user_fk = :user_id
+        ORDER BY count DESC
+        LIMIT :limit
+        """,
+    'terms_by_issue': """
+        SELECT term, count
+        FROM issue_terms
+        WHERE issue_fk = :issue_id
+        ORDER BY count DESC
+        LIMIT :limit
+        """,
+    # Cells of the comment label cube, see rollups.py. A repository's cells are
+    # read whole and rolled up in pandas, issues and users only ever need their
+    # sentiment x emotion counts.
+    'labels_by_repo': """
+        SELECT issue_fk, user_fk, sentiment, emotion, count
+        FROM comment_labels
+        WHERE repo_fk = :repo_id
+        """,
+    'labels_by_issue': """
+        SELECT sentiment, emotion, SUM(count) AS count
+        FROM comment_labels
+        WHERE issue_fk = :issue_id
+        GROUP BY sentiment, emotion
+        """,
+    'labels_by_user': """
+        SELECT sentiment, emotion, SUM(count) AS count
+        FROM comment_labels
+        WHERE user_fk = :user_id
+        GROUP BY sentiment, emotion
+        """,
+    # Issues matching a full-text query, best first, see search.py. With ORDER
+    # BY rank LIMIT FTS5 only cuts snippets for the rows it returns.
+    'search_issues': """
+        WITH hits AS MATERIALIZED (
+            SELECT rowid AS id, title, snippet(issue_text, -1, '**', '**', '…', :snippet_words) AS snippet, rank
+            FROM issue_text
+            WHERE issue_text MATCH :query
+            ORDER BY rank
+            LIMIT :limit
+        )
+        SELECT h.id, s.number, h.title, h.snippet
+        FROM hits AS h LEFT JOIN issues AS s ON s.id = h.id
+        ORDER BY h.rank
+        """,
+    # Everything the Comments page shows for a repository in one statement,
+    # the activity chart aside. The number of commenters and the label counts
+    # come from the import rollups, the comments per user from the comments
+    # snapshot (see comment_users). Rows are tagged by kind.
+    'comments_summary': """
+        SELECT 'commenters' AS kind, NULL AS label, NULL AS user_fk, NULL AS author_association,
+               commenter_count AS count
+        FROM repo_activity
+        WHERE repo_fk = :repo_id
+        UNION ALL
+        SELECT 'sentiment', sentiment, NULL, NULL, SUM(count)
+        FROM comment_labels
+        WHERE repo_fk = :repo_id
+        GROUP BY sentiment
+        UNION ALL
+        SELECT 'emotion', emotion, NULL, NULL, SUM(count)
+        FROM comment_labels
+        WHERE repo_fk = :repo_id
+        GROUP BY emotion
+        UNION ALL
+        SELECT 'issue', NULL, user_fk, NULL, COUNT(*)
+        FROM issues
+        WHERE repo_fk = :repo_id
+        GROUP BY user_fk
+        UNION ALL
+        SELECT 'commit', NULL, user_fk, NULL, COUNT(*)
+        FROM commits
+        WHERE repo_fk = :repo_id
+        GROUP BY user_fk
+        """,
+    # The comments per user of a repository, for a generation whose snapshots
+    # are not written yet. With MAX the bare author_association is the one of
+    # the user's last comment.
+    'comment_users': """
+        SELECT c.user_fk, c.author_association, COUNT(*) AS count, MAX(c.id) AS last_comment
+        FROM issues AS s, comments AS c
+        WHERE s.repo_fk = :repo_id AND s.id = c.issue_fk
+        GROUP BY c.user_fk
+        """,
+}.items()}
+
+# Terms drawn in a word cloud
+WORD_CLOUD_TERMS = 200
+# Issues listed for a search and the words around the match in their snippet
+SEARCH_RESULTS = 50
+SNIPPET_WORDS = 16
+# Options a picker shows at a time
+PICKER_PAGE_SIZE = 50
+# Keyset cursor of a first page, above any count or id stored
+FIRST_PAGE = 2 ** 63 - 1
+# Activity chart buckets from the finest, with their length in days, and the
+# most bars a chart is drawn with: a window gets the finest bucket that fits
+BUCKET_DAYS = {'day': 1, 'week': 7, 'month': 30.44, 'year': 365.25}
+MAX_CHART_POINTS = 200
+# Above every character in a prefix range
+PREFIX_END = '\U0010ffff'
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def read_query(name, **params):
+    # numpy scalars (ids picked from DataFrames) cannot be bound by sqlite3
+    params = {key: value.item() if isinstance(value, np.generic) else value for key, value in params.items()}
+    statements = set()
+    start = time.perf_counter()
+    with get_engine().connect() as conn:
+        # The SQL texts the driver is handed, each one is prepared once per connection
+        event.listen(conn, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.add(statement))
+        df = pd.read_sql(QUERIES[name], conn, params=params)
+    seconds = time.perf_counter() - start
+    with _stats_lock:
+        calls, total, texts = _stats.get(name, (0, 0.0, set()))
+        _stats[name] = (calls + 1, total + seconds, texts | statements)
+    return df
+
+
+def query_stats():
+    # Executions per named query and the distinct SQL texts they sent: one per
+    # name means every call after the first on a pooled connection reused the
+    # prepared statement
+    with _stats_lock:
+        stats = dict(_stats)
+    return pd.DataFrame(
+        [{'query': name, 'sql_texts': len(texts), 'calls': calls, 'total_ms': total * 1000,
+          'mean_ms': total * 1000 / calls} for name, (calls, total, texts) in stats.items()],
+        columns=['query', 'sql_texts', 'calls', 'total_ms', 'mean_ms'])
+
+
+def user_types(df_users):
+    conditions = [
+        df_users['commits_count'] > df_users['comments_count'],  # Condition for 'commiter'
+        df_users['commits_count'] < df_users['comments_count'],  # Condition for 'commenter'
+        df_users['commits_count'] == df_users['comments_count']  # Condition for 'contributor'
+    ]
+    choices = ['commiter', 'commenter', 'contributor']
+    return np.select(conditions, choices, default='Not Specified')
+
+
+def roll_up(cells, by):
+    # Sums the counts of label cells over every column not in by, largest first.
+    # NULL labels are a group of their own.
+    counts = cells.groupby(by, dropna=False)['count'].sum().reset_index()
+    return counts.sort_values('count', ascending=False, ignore_index=True)
+
+
+@cached
+def load_repositories():
+    return read_query('repositories')
+
+
+@cached
+def get_commits_by_repo(repo_id):
+    # Commits per day for a given repository, from the rollup built by the import
+    return read_query('commits_by_repo', repo_id=repo_id)
+
+
+def chart_bucket(start, end):
+    days = (end - start).days + 1
+    return next((bucket for bucket, length in BUCKET_DAYS.items() if days / length <= MAX_CHART_POINTS), 'year')
+
+
+@cached
+def load_activity_days(repo_id):
+    # first_day and last_day of a repository by activity ('commit' or 'comment'),
+    # for the activities it has any of
+    days = read_query('activity_days', repo_id=repo_id).dropna().set_index('activity')
+    return days.apply(lambda column: column.map(date.fromisoformat))
+
+
+@cached
+def load_activity(activity, repo_id, start, end):
+    # Commits or comments of a repository from start to end, in the bucket
+    # chart_bucket picks, newest first, and the total of the as long window
+    # before start the metrics compare with
+    bucket = chart_bucket(start, end)
+    previous_end = start - timedelta(days=1)
+    previous_start = previous_end - (end - start)
+    rows = read_query(f'{activity}_activity', repo_id=repo_id, bucket=bucket,
+                      start=start.isoformat(), end=end.isoformat(),
+                      previous_start=previous_start.isoformat(), previous_end=previous_end.isoformat())
+    # Counts come back as floats when the window before is empty, its total NULL
+    counts = rows[rows['kind'] == 'bucket'][['date', 'count']].astype({'count': 'int64'})
+    counts = counts.sort_values('date', ascending=False, ignore_index=True)
+    return {
+        'bucket': bucket,
+        'counts': counts,
+        'total': int(counts['count'].sum()),
+        'previous': int(rows.loc[rows['kind'] == 'previous', 'count'].fillna(0).sum()),
+    }
+
+
+def repo_ids_param(repo_ids):
+    return json.dumps(sorted(int(repo_id) for repo_id in repo_ids))
+
+
+@cached
+def load_comparison(repo_ids):
+    # Totals and comment sentiment of several repositories, one row per
+    # repository, and the first and last day of their activity, from one
+    # comparison_summary query
+    summary = read_query('comparison_summary', repo_ids=repo_ids_param(repo_ids))
+    kinds = {kind: rows for kind, rows in summary.groupby('kind')}
+    empty = summary.iloc[:0]
+
+    totals = kinds.get('totals', empty).set_index('repo_fk')[
+        ['commit_count', 'committer_count', 'comment_count', 'commenter_count']]
+    sentiment = kinds.get('sentiment', empty).pivot_table(index='repo_fk', columns='label', values='comment_count',
+                                                          aggfunc='sum', fill_value=0)
+    # Share of each sentiment among a repository's labelled comments
+    sentiment = sentiment.div(sentiment.sum(axis=1), axis=0).add_suffix('_share')
+    repos = totals.join(sentiment, how='left').astype('float64')
+    repos.index = repos.index.astype('int64')
+    days = {kind: date.fromisoformat(kinds[kind]['label'].iloc[0])
+            for kind in ['first_day', 'last_day'] if kind in kinds and pd.notna(kinds[kind]['label'].iloc[0])}
+    return {'repos': repos, **days}
+
+
+@cached
+def load_comparison_activity(repo_ids, start, end):
+    # Commits and comments of several repositories from start to end, one row
+    # per activity, repository and chart_bucket bucket
+    bucket = chart_bucket(start, end)
+    counts = read_query('comparison_activity', repo_ids=repo_ids_param(repo_ids), bucket=bucket,
+                        start=start.isoformat(), end=end.isoformat())
+    return {'bucket': bucket, 'counts': counts}
+
+
+@cached
+def get_number_of_committers(repo_id):
+    dev_count = read_query('committers_count', repo_id=repo_id)
+    return dev_count.loc[0, 'dev_count'] if not dev_count.empty else 0
+
+
+def load_comment_users(repo_id):
+    # Only the repository's partition of the comments snapshot is read, and of it
+    # only the two columns counted. The issues x comments join in SQLite is the
+    # fallback until the snapshots of the current generation are written.
+    # Imported here, pyarrow.dataset is only needed by this page.
+    from .snapshots import load_repo_snapshot
+    comments = load_repo_snapshot('comments', repo_id, columns=['id', 'user_fk', 'author_association'])
+    if comments is None:
+        return read_query('comment_users', repo_id=repo_id).drop(columns='last_comment')
+    # The association of a user's last comment, NULL users are a group of their own
+    users = comments.sort_values('id').groupby('user_fk', dropna=False)
+    return pd.DataFrame({'author_association': users['author_association'].last(),
+                         'count': users.size()}).reset_index()
+
+
+@cached
+def load_comments_summary(repo_id):
+    # The number of commenters, the sentiment and emotion counts and the
+    # comments, issues and commits per user, split out of one comments_summary query
+    summary = read_query('comments_summary', repo_id=repo_id)
+    kinds = {kind: rows for kind, rows in summary.groupby('kind')}
+    kinds['comment'] = load_comment_users(repo_id)
+    empty = summary.iloc[:0]
+
+    sentiment_count = kinds.get('sentiment', empty)[['label', 'count']].reset_index(drop=True)
+    sentiment_count.columns = ['Sentiment', 'Frequency']
+    emotion_count = kinds.get('emotion', empty)[['label', 'count']].reset_index(drop=True)
+    emotion_count.columns = ['Emotion', 'Frequency']
+
+    per_user = {kind: kinds.get(kind, empty).set_index('user_fk')
+                for kind in ['comment', 'issue', 'commit']}
+    df_users = per_user['comment'][['author_association', 'count']].rename(columns={'count': 'comments_count'})
+    df_users = df_users.join(per_user['issue'][['count']].rename(columns={'count': 'issues_count'}), how='inner')
+    df_users = df_users.join(per_user['commit'][['count']].rename(columns={'count': 'commits_count'}), how='inner')
+    df_users.index.name = 'user_id'
+    df_users['type'] = user_types(df_users)
+
+    return {
+        'commenters': kinds['commenters']['count'].iloc[0] if 'commenters' in kinds else 0,
+        'sentiment': sentiment_count,
+        'emotion': emotion_count,
+        'users': df_users,
+    }
+
+
+def load_issue_page(repo_id, after=None, limit=PICKER_PAGE_SIZE):
+    # A page of a repository's issues, most commented first. after is the
+    # (comments, id) of the last issue of the previous page. Not cached, like
+    # the other picker pages: each is one index range scan.
+    after_comments, after_id = after or (FIRST_PAGE, FIRST_PAGE)
+    return read_query('issue_page', repo_id=repo_id, after_comments=after_comments, after_id=after_id, limit=limit)
+
+
+@cached
+def load_issue(issue_id):
+    return read_query('issue', issue_id=issue_id).iloc[0]
+
+
+@cached
+def get_comments_by_issue(issue_id):
+    return read_query('comments_by_issue', issue_id=issue_id)
+
+
+@cached
+def get_reactions_by_issue(issue_id):
+    return read_query('reactions_by_issue', issue_id=issue_id)
+
+
+@cached
+def get_events_by_issue(issue_id):
+    return read_query('events_by_issue', issue_id=issue_id)
+
+
+def load_committer_page(repo_id, prefix='', after=None, limit=PICKER_PAGE_SIZE):
+    # A page of a repository's committers: by commit count, after the
+    # (commit_count, user_fk) of the previous page's last row, or with a name
+    # prefix by name, after its (name, user_fk)
+    if prefix:
+        after_name, after_user = after or ('', -1)
+        return read_query('committer_page_by_name', repo_id=repo_id, prefix=prefix, prefix_end=prefix + PREFIX_END,
+                          after_name=after_name, after_user=after_user, limit=limit)
+    after_count, after_user = after or (FIRST_PAGE, FIRST_PAGE)
+    return read_query('committer_page', repo_id=repo_id, after_count=after_count, after_user=after_user, limit=limit)
+
+
+@cached
+def load_commits(commiter_id):
+    return read_query('commits_by_committer', committer_id=commiter_id)
+
+
+@cached
+def load_files(committer_id):
+    return read_query('files_by_committer', committer_id=committer_id)
+
+
+@cached
+def load_co_committers(committer_id):
+    # (file_fk, user_fk) pairs: the other users who committed to each file of the committer
+    return read_query('co_committers', committer_id=committer_id)
+
+
+@cached
+def load_sentiment(committer_id):
+    return read_query('comments_by_user', user_id=committer_id)
+
+
+@cached
+def load_repo_labels(repo_id):
+    # (issue_fk, user_fk, sentiment, emotion, count) cells of the comment label cube
+    return read_query('labels_by_repo', repo_id=repo_id)
+
+
+@cached
+def load_issue_labels(issue_id):
+    # Comments of an issue per sentiment and emotion
+    return read_query('labels_by_issue', issue_id=issue_id)
+
+
+@cached
+def load_user_labels(user_id):
+    return read_query('labels_by_user', user_id=user_id)
+
+
+@cached
+def load_user_terms(user_id, limit=WORD_CLOUD_TERMS):
+    # Most frequent terms of all comments written by a user, counted at import time
+    return read_query('terms_by_user', user_id=user_id, limit=limit)
+
+
+@cached
+def load_issue_terms(issue_id, limit=WORD_CLOUD_TERMS):
+    return read_query('terms_by_issue', issue_id=issue_id, limit=limit)
+
+
+def search_issues(repo_id, text, limit=SEARCH_RESULTS):
+    # Not cached: a search is one lookup in the full-text indexes, and every
+    # entry typed in the search box would be a new cache entry
+    query = match_expression(repo_id, text)
+    if query is None:
+        return pd.DataFrame(columns=['id', 'number', 'title', 'snippet'])
+    return read_query('search_issues', query=query, limit=limit, snippet_words=SNIPPET_WORDS)
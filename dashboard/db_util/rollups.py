@@ -0,0 +1,94 @@
+from .models import CommentLabels, DailyCommits, DailyComments, RepoActivity, RepoCommitters
+
+# Each rollup is filled by one INSERT ... SELECT. {repos} is replaced by a filter
+# on the repositories being refreshed, or by nothing for a full build.
+ROLLUP_QUERIES = {
+    DailyCommits.__tablename__: """
+        INSERT INTO daily_commits (repo_fk, day, count)
+        SELECT repo_fk, DATE(created_at), COUNT(*)
+        FROM commits
+        WHERE repo_fk IS NOT NULL AND created_at IS NOT NULL {repos}
+        GROUP BY repo_fk, DATE(created_at)
+        """,
+    DailyComments.__tablename__: """
+        INSERT INTO daily_comments (repo_fk, day, count)
+        SELECT s.repo_fk, DATE(c.created_at), COUNT(*)
+        FROM issues AS s, comments AS c
+        WHERE s.id = c.issue_fk AND s.repo_fk IS NOT NULL AND c.created_at IS NOT NULL {repos}
+        GROUP BY s.repo_fk, DATE(c.created_at)
+        """,
+    RepoCommitters.__tablename__: """
+        INSERT INTO repo_committers (repo_fk, user_fk, commit_count)
+        SELECT repo_fk, user_fk, COUNT(*)
+        FROM commits
+        WHERE repo_fk IS NOT NULL AND user_fk IS NOT NULL {repos}
+        GROUP BY repo_fk, user_fk
+        """,
+    RepoActivity.__tablename__: """
+        INSERT INTO repo_activity (repo_fk, commit_count, committer_count, comment_count, commenter_count)
+        SELECT r.id,
+               (SELECT COUNT(*) FROM commits WHERE repo_fk = r.id),
+               (SELECT COUNT(DISTINCT user_fk) FROM commits WHERE repo_fk = r.id),
+               (SELECT COUNT(*) FROM issues AS s, comments AS c WHERE s.repo_fk = r.id AND s.id = c.issue_fk),
+               (SELECT COUNT(DISTINCT c.user_fk) FROM issues AS s, comments AS c
+                WHERE s.repo_fk = r.id AND s.id = c.issue_fk)
+        FROM repositories AS r
+        WHERE true {repos}
+        """,
+    # Count cube of the comment labels: every sentiment or emotion histogram of a
+    # repository, issue or user is a sum over its cells
+    CommentLabels.__tablename__: """
+        INSERT INTO comment_labels (repo_fk, issue_fk, user_fk, sentiment, emotion, count)
+        SELECT s.repo_fk, c.issue_fk, c.user_fk, c.sentiment, c.emotion, COUNT(*)
+        FROM issues AS s, comments AS c
+        WHERE s.id = c.issue_fk AND s.repo_fk IS NOT NULL {repos}
+        GROUP BY s.repo_fk, c.issue_fk, c.user_fk, c.sentiment, c.emotion
+        """,
+}
+
+# Column holding the repository in each rollup query's outer table
+ROLLUP_REPO_COLUMNS = {
+    DailyCommits.__tablename__: 'repo_fk',
+    DailyComments.__tablename__: 's.repo_fk',
+    RepoCommitters.__tablename__: 'repo_fk',
+    RepoActivity.__tablename__: 'r.id',
+    CommentLabels.__tablename__: 's.repo_fk',
+}
+
+# Repositories touched by the rows an incremental import changed, read from the
+# temp.delta_<table> key tables filled by db_import.update_db. A row that moved
+# to another repository touches the one it left too, the delta tables keep its
+# previous repo_fk.
+AFFECTED_REPOS_QUERY = """
+    SELECT repo_fk FROM commits WHERE id IN (SELECT id FROM temp.delta_commits)
+    UNION SELECT repo_fk FROM temp.delta_commits
+    UNION SELECT repo_fk FROM issues WHERE id IN (SELECT id FROM temp.delta_issues)
+    UNION SELECT repo_fk FROM temp.delta_issues
+    UNION SELECT s.repo_fk FROM issues AS s, comments AS c
+          WHERE s.id = c.issue_fk AND c.id IN (SELECT id FROM temp.delta_comments)
+    UNION SELECT s.repo_fk FROM issues AS s, temp.delta_comments AS d WHERE s.id = d.issue_fk
+    UNION SELECT id FROM temp.delta_repositories
+    """
+
+
+def build_rollups(conn):
+    for table, query in ROLLUP_QUERIES.items():
+        conn.exec_driver_sql(f'DELETE FROM {table}')
+        conn.exec_driver_sql(query.format(repos=''))
+
+
+def refresh_rollups(conn):
+    # Recomputes the rollup rows of the repositories an incremental import
+    # touched. A rollup that is still empty, in a database built before it
+    # existed for instance, is built in full.
+    if any(conn.exec_driver_sql(f'SELECT COUNT(*) FROM {table}').scalar() == 0
+           for table in [RepoActivity.__tablename__, RepoCommitters.__tablename__, CommentLabels.__tablename__]):
+        build_rollups(conn)
+        return
+    conn.exec_driver_sql('DROP TABLE IF EXISTS temp.rollup_repos')
+    conn.exec_driver_sql(f'CREATE TEMP TABLE rollup_repos AS {AFFECTED_REPOS_QUERY}')
+    for table, query in ROLLUP_QUERIES.items():
+        conn.exec_driver_sql(f'DELETE FROM {table} WHERE repo_fk IN (SELECT repo_fk FROM temp.rollup_repos)')
+        repos = f'AND {ROLLUP_REPO_COLUMNS[table]} IN (SELECT repo_fk FROM temp.rollup_repos)'
+        conn.exec_driver_sql(query.format(repos=repos))
+    conn.exec_driver_sql('DROP TABLE temp.rollup_repos')
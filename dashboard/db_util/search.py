@@ -0,0 +1,74 @@
+import re
+
+# FTS5 full-text index of the issues, built by the import and searched by the
+# Issues page. One document per issue, its rowid the issue id: the title, the
+# description and the bodies of all its comments, so a search ranks issues
+# directly and an incremental import re-indexes just the issues it touched.
+# The repository id is indexed too, a search only ranks the issues of one
+# repository. It comes last, snippets are cut from the first column with the
+# most matches. Text is stored in the index.
+SEARCH_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS issue_text USING fts5(
+        title, body, comments, repo, tokenize = 'porter unicode61'
+    )
+    """
+
+# Documents of the issues matching {where}. Bodies hold escaped line breaks, as
+# the Issues page shows, they would glue words together.
+SEARCH_INSERT = """
+    INSERT INTO issue_text (rowid, title, body, comments, repo)
+    SELECT s.id, s.title, REPLACE(s.body, '\\n', ' '),
+           (SELECT GROUP_CONCAT(REPLACE(c.body, '\\n', ' '), ' ') FROM comments AS c WHERE c.issue_fk = s.id),
+           s.repo_fk
+    FROM issues AS s
+    WHERE true {where}
+    """
+
+# Issues an incremental import inserted or changed, or whose comments it did,
+# including the issues changed comments were on before the import
+DELTA_QUERY = """
+    SELECT id FROM temp.delta_issues
+    UNION SELECT issue_fk FROM comments WHERE id IN (SELECT id FROM temp.delta_comments)
+    UNION SELECT issue_fk FROM temp.delta_comments
+    """
+
+# bm25 weights of title, description, comments and repo: a word in the title
+# counts ten times one in a comment
+SEARCH_WEIGHTS = (10.0, 2.0, 1.0, 0.0)
+
+# Words of a search box entry: anything FTS5 would read as query syntax is dropped
+SEARCH_WORD_PATTERN = r'\w+'
+
+
+def create_search_table(conn):
+    conn.exec_driver_sql(SEARCH_TABLE)
+    weights = ', '.join(map(str, SEARCH_WEIGHTS))
+    conn.exec_driver_sql(f"INSERT INTO issue_text (issue_text, rank) VALUES ('rank', 'bm25({weights})')")
+
+
+def build_search(conn):
+    create_search_table(conn)
+    conn.exec_driver_sql('DELETE FROM issue_text')
+    conn.exec_driver_sql(SEARCH_INSERT.format(where=''))
+    # Merges the index segments the bulk insert left behind
+    conn.exec_driver_sql("INSERT INTO issue_text (issue_text) VALUES ('optimize')")
+
+
+def refresh_search(conn):
+    # Re-indexes the issues an incremental import touched
+    create_search_table(conn)
+    if conn.exec_driver_sql('SELECT COUNT(*) FROM issue_text').scalar() == 0:
+        build_search(conn)
+        return
+    conn.exec_driver_sql(f'DELETE FROM issue_text WHERE rowid IN ({DELTA_QUERY})')
+    conn.exec_driver_sql(SEARCH_INSERT.format(where=f'AND s.id IN ({DELTA_QUERY})'))
+
+
+def match_expression(repo_id, text):
+    # FTS5 query for a search box entry in a repository: every word must occur
+    # in the text columns, the last one may still be being typed and matches as
+    # a prefix. None when there is no word.
+    words = re.findall(SEARCH_WORD_PATTERN, text)
+    if not words:
+        return None
+    return f'repo : "{repo_id}" AND {{title body comments}} : (' + ' '.join(f'"{word}"' for word in words) + '*)'
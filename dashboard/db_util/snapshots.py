@@ -0,0 +1,149 @@
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+from sqlalchemy import Boolean, Integer, TIMESTAMP, create_engine
+
+from .config import DB_PATH, db_generation
+from .models import Comment, Commit, Event, FileCommit, File, Issue, Reaction, Repository, User
+
+# Columnar copies of the tables as Parquet datasets, written once an import has
+# published the database, one directory per database generation next to it:
+# <database>_snapshots/<generation>/<table>. Query results stay keyed to the database
+# generation alone, a snapshot being written never invalidates them. A
+# generation whose snapshots are not written yet is read from SQLite instead.
+
+SNAPSHOT_MODELS = {model.__tablename__: model
+                   for model in [User, Repository, Issue, Comment, Commit, Event, FileCommit, File, Reaction]}
+
+# Tables without their own repo_fk get it through the row they belong to, so the
+# snapshot can still be partitioned per repository
+REPO_JOINS = {
+    'comments': ('issues', 'issue_fk'),
+    'file_commits': ('files', 'file_fk'),
+}
+
+# Rows read from SQLite per record batch, and the most rows of a Parquet row
+# group. The writer holds a row group of every partition in memory until it is
+# full, so this rather than the import's chunk size bounds its memory.
+SNAPSHOT_CHUNK_SIZE = 10000
+
+REPO_PARTITIONING = ds.partitioning(pa.schema([('repo_fk', pa.int64())]), flavor='hive')
+
+
+def arrow_type(column):
+    # Foreign keys take the type of the key they point to
+    for foreign_key in column.foreign_keys:
+        return arrow_type(foreign_key.column)
+    if isinstance(column.type, TIMESTAMP):
+        return pa.timestamp('us')
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    return pa.string()
+
+
+def snapshot_schema(model):
+    fields = [pa.field(column.name, arrow_type(column)) for column in model.__table__.columns]
+    if model.__tablename__ in REPO_JOINS:
+        fields.append(pa.field('repo_fk', pa.int64()))
+    return pa.schema(fields)
+
+
+def snapshot_query(model):
+    table = model.__tablename__
+    if table in REPO_JOINS:
+        parent, key = REPO_JOINS[table]
+        return (f'SELECT t.*, p.repo_fk AS repo_fk FROM {table} AS t '
+                f'LEFT JOIN {parent} AS p ON p.id = t.{key}')
+    return f'SELECT * FROM {table}'
+
+
+def record_batches(conn, model, schema, chunk_size):
+    for chunk in pd.read_sql(snapshot_query(model), conn, chunksize=chunk_size):
+        for field in schema:
+            if pa.types.is_timestamp(field.type):
+                chunk[field.name] = pd.to_datetime(chunk[field.name], format='ISO8601', errors='coerce')
+            elif pa.types.is_integer(field.type):
+                chunk[field.name] = pd.to_numeric(chunk[field.name], errors='coerce').astype('Int64')
+            elif pa.types.is_boolean(field.type):
+                chunk[field.name] = chunk[field.name].astype('boolean')
+            else:
+                chunk[field.name] = chunk[field.name].astype('string')
+        yield pa.RecordBatch.from_pandas(chunk[schema.names], schema=schema, preserve_index=False)
+        # Arrow's allocator keeps what the written batches freed, handing it back
+        # bounds the import by a couple of batches instead of the whole table
+        pa.default_memory_pool().release_unused()
+
+
+def is_partitioned(model):
+    return 'repo_fk' in snapshot_schema(model).names
+
+
+def snapshot_dir(db_path=DB_PATH):
+    return f'{os.path.splitext(db_path)[0]}_snapshots'
+
+
+def generation_dir(db_path, generation):
+    return os.path.join(snapshot_dir(db_path), str(generation))
+
+
+def write_snapshot(conn, model, path, chunk_size):
+    schema = snapshot_schema(model)
+    partitioning = REPO_PARTITIONING if is_partitioned(model) else None
+    ds.write_dataset(record_batches(conn, model, schema, chunk_size), path, schema=schema, format='parquet',
+                     partitioning=partitioning, max_rows_per_group=chunk_size,
+                     existing_data_behavior='overwrite_or_ignore')
+
+
+def write_snapshots(db_path, tables=None, previous_generation=None, chunk_size=SNAPSHOT_CHUNK_SIZE):
+    # Snapshots of the database published at db_path. tables limits the ones
+    # written to the given table names, the others are hard links to the files
+    # of previous_generation where it has them. Built aside and renamed into
+    # place, then the snapshots of every other generation are removed.
+    target = generation_dir(db_path, db_generation(db_path))
+    previous = generation_dir(db_path, previous_generation) if previous_generation else None
+    building = f'{target}.building'
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    engine = create_engine(f'sqlite:///file:{db_path}?mode=ro&uri=true')
+    try:
+        with engine.connect() as conn:
+            for table, model in SNAPSHOT_MODELS.items():
+                path = os.path.join(building, table)
+                if tables is not None and table not in tables and previous and os.path.isdir(
+                        os.path.join(previous, table)):
+                    shutil.copytree(os.path.join(previous, table), path, copy_function=os.link)
+                else:
+                    write_snapshot(conn, model, path, chunk_size)
+    finally:
+        engine.dispose()
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(building, target)
+    for name in os.listdir(snapshot_dir(db_path)):
+        if name != os.path.basename(target):
+            shutil.rmtree(os.path.join(snapshot_dir(db_path), name), ignore_errors=True)
+
+
+def load_snapshot(table, columns=None, filters=None, db_path=DB_PATH):
+    # The table's snapshot of the current database generation, None while it has
+    # none. Column pruning and predicate pushdown happen in Arrow, only the
+    # requested columns of the matching partitions and row groups are read,
+    # through memory maps.
+    path = os.path.join(generation_dir(db_path, db_generation(db_path)), table)
+    partitioning = REPO_PARTITIONING if is_partitioned(SNAPSHOT_MODELS[table]) else None
+    try:
+        dataset = ds.dataset(path, format='parquet', partitioning=partitioning,
+                             filesystem=fs.LocalFileSystem(use_mmap=True))
+        return dataset.to_table(columns=columns, filter=filters).to_pandas()
+    except (FileNotFoundError, pa.ArrowException):
+        # Not written yet, or removed by the import of a newer generation meanwhile
+        return None
+
+
+def load_repo_snapshot(table, repo_id, columns=None, db_path=DB_PATH):
+    return load_snapshot(table, columns=columns, filters=ds.field('repo_fk') == int(repo_id), db_path=db_path)
@@ -0,0 +1,90 @@
+import pandas as pd
+
+from .models import IssueTerms, UserTerms
+
+# Comment bodies are tokenized once, at import time, into term counts per user
+# and per issue. Word clouds are drawn from the top terms, whatever the volume
+# of text behind them.
+TERM_TABLES = {
+    UserTerms.__tablename__: 'user_fk',
+    IssueTerms.__tablename__: 'issue_fk',
+}
+
+# Words as WordCloud splits them: starting with a letter, apostrophes allowed
+TERM_PATTERN = r"[^\W\d_][\w']*"
+MIN_TERM_LENGTH = 3
+STOPWORDS = frozenset("""
+    about above after again against all also and any are aren't because been before being below between
+    both but can can't cannot com could couldn't did didn't does doesn't doing don't down during each else
+    ever few for from further get had hadn't has hasn't have haven't having he'd he'll her here here's hers
+    herself him himself his how how's however http https i'd i'll i'm i've into isn't it's its itself just
+    let's like more most mustn't myself nor not off once only other otherwise ought our ours ourselves out
+    over own same shall shan't she she'd she'll she's should shouldn't since some such than that that's the
+    their theirs them themselves then there there's these they they'd they'll they're they've this those
+    through too under until very was wasn't we'd we'll we're we've were weren't what what's when when's
+    where where's which while who who's whom why why's will with won't would wouldn't www you you'd you'll
+    you're you've your yours yourself yourselves
+    """.split())
+
+# Term occurrences a comment expands to, about. The import tokenizes
+# chunk_size // TERMS_PER_COMMENT comments at a time, so a chunk of terms takes
+# about the memory of a chunk of CSV rows and --chunk-size bounds both.
+TERMS_PER_COMMENT = 10
+
+# Users or issues of the comments an incremental import inserted or changed,
+# from temp.delta_comments, before and after the import: a comment moved to
+# another user or issue takes its terms away from the previous one
+DELTA_QUERY = ('SELECT {key} FROM comments WHERE id IN (SELECT id FROM temp.delta_comments) '
+               'UNION SELECT {key} FROM temp.delta_comments')
+
+
+def tokenize(comments):
+    # One row per term occurrence, with the user and issue of its comment
+    terms = comments['body'].str.lower().str.findall(TERM_PATTERN)
+    terms = comments[['user_fk', 'issue_fk']].join(terms.explode().rename('term')).dropna(subset=['term'])
+    terms['term'] = terms['term'].str.removesuffix("'s").str.strip("'")
+    return terms[(terms['term'].str.len() >= MIN_TERM_LENGTH) & ~terms['term'].isin(STOPWORDS)]
+
+
+def add_terms(conn, chunk_size, tables=TERM_TABLES, where=''):
+    # Adds the terms of the comments matching where to the counts already
+    # stored, chunk by chunk: only the counts of one chunk are held in memory
+    query = f'SELECT user_fk, issue_fk, body FROM comments WHERE body IS NOT NULL {where}'
+    for chunk in pd.read_sql(query, conn, chunksize=max(chunk_size // TERMS_PER_COMMENT, 1)):
+        terms = tokenize(chunk)
+        for table in tables:
+            key = TERM_TABLES[table]
+            counts = terms.dropna(subset=[key]).groupby([key, 'term']).size()
+            rows = list(zip(counts.index.get_level_values(0).astype('int64').tolist(),
+                            counts.index.get_level_values(1).tolist(), counts.tolist()))
+            if rows:
+                conn.exec_driver_sql(
+                    f'INSERT INTO {table} ({key}, term, count) VALUES (?, ?, ?) '
+                    f'ON CONFLICT ({key}, term) DO UPDATE SET count = count + excluded.count', rows)
+
+
+def build_terms(conn, chunk_size):
+    for table in TERM_TABLES:
+        conn.exec_driver_sql(f'DELETE FROM {table}')
+    add_terms(conn, chunk_size)
+
+
+def refresh_terms(conn, chunk_size):
+    # Recounts the terms of the users and issues whose comments an incremental
+    # import inserted or changed
+    if all(conn.exec_driver_sql(f'SELECT COUNT(*) FROM {table}').scalar() == 0 for table in TERM_TABLES):
+        build_terms(conn, chunk_size)
+        return
+    for table, key in TERM_TABLES.items():
+        affected = DELTA_QUERY.format(key=key)
+        conn.exec_driver_sql(f'DELETE FROM {table} WHERE {key} IN ({affected})')
+        add_terms(conn, chunk_size, tables=[table], where=f'AND {key} IN ({affected})')
+
+
+def term_frequencies(terms):
+    # term -> count for WordCloud.generate_from_frequencies, with plurals counted
+    # under their singular when both are present, as WordCloud.generate does
+    frequencies = dict(zip(terms['term'], terms['count']))
+    for term in [term for term in frequencies if term.endswith('s') and term[:-1] in frequencies]:
+        frequencies[term[:-1]] += frequencies.pop(term)
+    return frequencies
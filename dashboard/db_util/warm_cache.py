@@ -0,0 +1,62 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import queries
+from .cache import cache_stats
+from .config import get_engine
+
+
+def load_history_activity(repo_id):
+    # The activity charts as the pages first draw them, over the whole history
+    for activity, (first_day, last_day) in queries.load_activity_days(repo_id).iterrows():
+        queries.load_activity(activity, repo_id, first_day, last_day)
+
+
+# Loaders run for every repository, the ones behind the first screen of each page
+REPO_LOADERS = [
+    load_history_activity,
+    queries.get_number_of_committers,
+    queries.load_comments_summary,
+    queries.load_repo_labels,
+]
+
+
+def warm_repositories(repo_ids):
+    # Process pool worker: every result it computes lands in the disk cache
+    before = cache_stats()
+    for repo_id in repo_ids:
+        for loader in REPO_LOADERS:
+            loader(repo_id)
+    after = cache_stats()
+    return len(repo_ids), after['disk_hits'] - before['disk_hits'], after['disk_writes'] - before['disk_writes']
+
+
+def warm_cache(workers=None):
+    # Precomputes the per-repository results of the current data generation, so
+    # a restarted server answers its first requests from disk
+    start = time.perf_counter()
+    repo_ids = queries.load_repositories()['id'].tolist()
+    workers = workers or os.cpu_count()
+    # Dealt round robin, so no worker gets a run of the largest repositories
+    batches = [repo_ids[worker::workers] for worker in range(workers)]
+    totals = [0, 0, 0]
+    # Forked workers must not share the connection load_repositories left in the
+    # pool, SQLite connections cannot be carried across a fork. Each worker
+    # opens its own.
+    get_engine().dispose()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for repos, disk_hits, disk_writes in pool.map(warm_repositories, batches):
+            totals = [totals[0] + repos, totals[1] + disk_hits, totals[2] + disk_writes]
+    print(f'warmed {totals[0]} repositories in {time.perf_counter() - start:.2f}s with {workers} workers, '
+          f'{totals[2]} results written, {totals[1]} already cached')
+    return totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill the on-disk query cache for every repository')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes, defaults to the number of CPUs')
+    args = parser.parse_args()
+    warm_cache(workers=args.workers)
@@ -1,13 +1,57 @@
 import os
+import subprocess
+import sys
+import threading
 
 import streamlit as st
 
-from db_util.db_import import import_db, DB_PATH
+from db_util.config import DB_PATH
 
 st.set_page_config(page_title="Ether Dash Tools", page_icon="🔥", layout="wide")
 
+
+@st.cache_resource
+def start_cache_warmup():
+    # Once per server process: fills the on-disk query cache with whatever the
+    # current database generation is still missing, in its own process pool
+    return subprocess.Popen([sys.executable, '-m', 'db_util.warm_cache'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+@st.cache_resource
+def start_background_import():
+    # Once per server process, again after a failed run is retried. The regular
+    # way to build or refresh the database is offline:
+    # python -m db_util.db_import [--incremental]
+    from db_util.db_import import import_db
+    state = {'error': None}
+
+    def run():
+        try:
+            import_db()
+        except Exception as error:
+            # Shown on the home page, the thread's own report goes to the server log
+            state['error'] = error
+            raise
+        start_cache_warmup()
+
+    state['thread'] = threading.Thread(target=run, name='import_db', daemon=True)
+    state['thread'].start()
+    return state
+
+
 if not os.path.exists(DB_PATH):
-    import_db()
+    background_import = start_background_import()
+    if background_import['error'] is not None:
+        st.error("Building the database failed.")
+        st.exception(background_import['error'])
+        if st.button('Retry'):
+            start_background_import.clear()
+            st.rerun()
+    else:
+        st.info("The database is being built in the background, the pages will show data once it is ready.")
+else:
+    start_cache_warmup()
 
 
 def setup_page():
@@ -0,0 +1,148 @@
+import base64
+import functools
+import json
+import math
+import os
+import time
+from collections import Counter
+
+import numpy as np
+import streamlit as st
+from streamlit_agraph import agraph, Node, Edge, Config
+
+IMG_DIR_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'imgs')
+
+# Node groups and their icon. The images travel once, in the config's groups,
+# instead of inside every node.
+GROUP_ICONS = {
+    'dev_main': 'dev_main.png',
+    'dev': 'dev.png',
+    'file': 'file.png',
+    'directory': 'file.png',
+}
+
+# Above these the browser's physics simulation stops being interactive
+MAX_NODES = 150
+MAX_EDGES = 400
+# Files drawn one by one in a committer's graph, the others are grouped per directory
+MAX_FILES = 60
+
+
+def plain_id(node_id):
+    # Ids picked from DataFrames, agraph serialises the nodes with plain json
+    return node_id.item() if isinstance(node_id, np.generic) else node_id
+
+
+@functools.lru_cache(maxsize=None)
+def icon_data_uri(file_name):
+    with open(os.path.join(IMG_DIR_PATH, file_name), 'rb') as img_file:
+        return f'data:image/png;base64,{base64.b64encode(img_file.read()).decode()}'
+
+
+def icon_groups(groups):
+    return {group: {'shape': 'circularImage', 'image': icon_data_uri(GROUP_ICONS[group])} for group in groups}
+
+
+class Graph:
+    # Nodes by id and edges weighted by how often they occur, reduced to a size
+    # the browser can lay out before it is turned into agraph nodes and edges
+
+    def __init__(self):
+        self.nodes = {}
+        self.edges = Counter()
+        self.total_nodes = 0
+        self.total_edges = 0
+
+    def add_node(self, node_id, group, size, label=None, title=None):
+        node_id = plain_id(node_id)
+        if node_id not in self.nodes:
+            self.nodes[node_id] = {'group': group, 'size': size, 'label': label, 'title': title}
+
+    def add_edge(self, source, target, weight=1):
+        self.edges[plain_id(source), plain_id(target)] += weight
+
+    def degrees(self):
+        degrees = Counter()
+        for (source, target), weight in self.edges.items():
+            degrees[source] += weight
+            degrees[target] += weight
+        return degrees
+
+    def prune(self, max_nodes=MAX_NODES, max_edges=MAX_EDGES, keep=()):
+        # Keeps the nodes with the highest weighted degree, then the edges of the
+        # nodes in keep and the heaviest of the others. Nodes in keep are never dropped.
+        self.total_nodes, self.total_edges = len(self.nodes), len(self.edges)
+        degrees = self.degrees()
+        ranked = sorted((node_id for node_id in self.nodes if node_id not in keep),
+                        key=lambda node_id: degrees[node_id], reverse=True)
+        kept = set(keep) | set(ranked[:max(max_nodes - len(keep), 0)])
+        edges = [(edge, weight) for edge, weight in self.edges.items() if edge[0] in kept and edge[1] in kept]
+        edges.sort(key=lambda item: (item[0][0] in keep or item[0][1] in keep, item[1]), reverse=True)
+        self.edges = Counter(dict(edges[:max_edges]))
+        linked = {node_id for edge in self.edges for node_id in edge}
+        self.nodes = {node_id: node for node_id, node in self.nodes.items()
+                      if node_id in keep or (node_id in kept and node_id in linked)}
+        return self
+
+    def to_agraph(self):
+        nodes = [Node(id=node_id, label=node['label'], title=node['title'], size=node['size'],
+                      shape='circularImage', group=node['group'])
+                 for node_id, node in self.nodes.items()]
+        edges = [Edge(source=source, target=target, value=weight, title=str(weight))
+                 if weight > 1 else Edge(source=source, target=target)
+                 for (source, target), weight in self.edges.items()]
+        return nodes, edges
+
+
+def file_graph(committer_id, files, co_committers, max_files=MAX_FILES):
+    # The committer, their files and the other committers of those files. Only
+    # the max_files files shared with the most people get a node of their own,
+    # the rest are collapsed into one node per directory.
+    graph = Graph()
+    committer_id = plain_id(committer_id)
+    graph.add_node(committer_id, 'dev_main', 30, label=committer_id)
+    files = files.drop_duplicates('id').to_dict('records')
+    files.sort(key=lambda file: len(co_committers.get(file['id'], [])), reverse=True)
+    directories = Counter(os.path.dirname(file['name']) or '/' for file in files[max_files:])
+    for directory, count in directories.items():
+        graph.add_node(f'dir:{directory}', 'directory', 15 + 5 * math.log2(count),
+                       label=f'{directory} ({count})', title=f'{count} files in {directory}')
+    for position, file in enumerate(files):
+        if position < max_files:
+            target = file['id']
+            graph.add_node(target, 'file', 15, title=file['name'])
+        else:
+            target = f"dir:{os.path.dirname(file['name']) or '/'}"
+        graph.add_edge(committer_id, target)
+        for file_committer in co_committers.get(file['id'], []):
+            graph.add_node(file_committer, 'dev', 20)
+            graph.add_edge(file_committer, target)
+    return graph.prune(keep={committer_id})
+
+
+def issue_graph(author_id, commenter_ids):
+    # The issue author and the commenters, each edge joins a comment to the next
+    # one and is weighted by how many times that pair follows each other
+    graph = Graph()
+    author_id = plain_id(author_id)
+    graph.add_node(author_id, 'dev_main', 30, label=author_id)
+    for user_id in commenter_ids:
+        graph.add_node(user_id, 'dev', 20, label=user_id)
+    for source, target in zip(commenter_ids, commenter_ids[1:]):
+        graph.add_edge(source, target)
+    return graph.prune(keep={author_id})
+
+
+def render_graph(graph, **config):
+    # Draws the graph and reports what it cost: nodes and edges sent against the
+    # full graph, the size of the payload and the time spent rendering it
+    start = time.perf_counter()
+    nodes, edges = graph.to_agraph()
+    config = Config(groups=icon_groups({node['group'] for node in graph.nodes.values()}), **config)
+    payload = len(json.dumps({'nodes': [node.to_dict() for node in nodes],
+                              'edges': [edge.to_dict() for edge in edges]}, default=str))
+    payload += len(json.dumps(config.__dict__))
+    return_value = agraph(nodes=nodes, edges=edges, config=config)
+    st.caption(f'{len(nodes)} of {graph.total_nodes} nodes, {len(edges)} of {graph.total_edges} edges, '
+               f'{payload / 1024:.0f} KB sent, rendered in {(time.perf_counter() - start) * 1000:.0f} ms')
+    return return_value
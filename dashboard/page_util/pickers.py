@@ -0,0 +1,41 @@
+import streamlit as st
+
+from db_util.queries import PICKER_PAGE_SIZE
+
+
+def paged_picker(label, key, load_page, id_column, cursor_columns, format_option, scope, page_size=PICKER_PAGE_SIZE):
+    # Sidebar selectbox over one page of options at a time, with buttons to move
+    # between pages. load_page(after, limit) reads the rows following the cursor
+    # after, the cursor_columns of the last row of the page before. The cursors
+    # of the pages already seen are kept in the session state, a new scope
+    # (another repository or filter) starts over from the first page.
+    # Returns the id_column of the selected row, None when there is none.
+    state = st.session_state.setdefault(key, {'scope': None, 'cursors': [None]})
+    if state['scope'] != scope:
+        state.update(scope=scope, cursors=[None])
+    # One row more than shown tells whether there is a next page
+    rows = load_page(state['cursors'][-1], page_size + 1)
+    has_next = len(rows) > page_size
+    rows = rows.iloc[:page_size]
+
+    previous_column, page_column, next_column = st.sidebar.columns(3)
+    if previous_column.button('Previous', key=f'{key}_previous', disabled=len(state['cursors']) == 1):
+        state['cursors'].pop()
+        st.rerun()
+    if next_column.button('Next', key=f'{key}_next', disabled=not has_next):
+        state['cursors'].append(tuple(rows.iloc[-1][list(cursor_columns)].tolist()))
+        st.rerun()
+    page_column.caption(f"Page {len(state['cursors'])}")
+
+    options = {row[id_column]: row for row in rows.to_dict('records')}
+    return st.sidebar.selectbox(label, list(options), format_func=lambda option: format_option(options[option]))
+
+
+def date_range_picker(first_day, last_day):
+    # Sidebar date range between two days, all of them by default. A new range
+    # of days (another repository) resets it. While only its start is picked
+    # the range is that one day, a cleared input stands for all the days.
+    days = st.sidebar.date_input('Date range', value=(first_day, last_day), min_value=first_day, max_value=last_day)
+    if not days:
+        return first_day, last_day
+    return days[0], days[-1]
@@ -0,0 +1,64 @@
+import argparse
+import os
+import tempfile
+
+from db_util.queries import get_commits_by_repo, load_comments_summary, load_sentiment
+
+# Builds one ydata_profiling report as HTML in a process of its own, started by
+# profiles.request_profile. Run as a module, never from a page, so the build
+# does not import the page script that asked for it:
+#     python -m page_util.profile_worker <report> <entity id> <path>
+
+# Frames above MINIMAL_ROWS are profiled in minimal mode (no correlations,
+# interactions or missing value diagrams), above SAMPLE_ROWS on a random sample
+MINIMAL_ROWS = 10000
+SAMPLE_ROWS = 100000
+
+
+def commits_frame(repo_id):
+    return get_commits_by_repo(repo_id).set_index('date')
+
+
+def commenters_frame(repo_id):
+    return load_comments_summary(repo_id)['users']
+
+
+def committer_comments_frame(committer_id):
+    return load_sentiment(committer_id)[['body', 'sentiment', 'emotion']]
+
+
+# Report name -> the frame it profiles, for one entity id
+PROFILE_FRAMES = {
+    'commits': commits_frame,
+    'commenters': commenters_frame,
+    'committer_comments': committer_comments_frame,
+}
+
+
+def build_profile(report, entity_id, path):
+    # Queries the frame, profiles it and moves the HTML into place
+    from ydata_profiling import ProfileReport
+    df = PROFILE_FRAMES[report](entity_id)
+    title = f'{report} {entity_id}'
+    if len(df) > SAMPLE_ROWS:
+        df = df.sample(SAMPLE_ROWS, random_state=0)
+        title = f'{title} (sample of {SAMPLE_ROWS} rows)'
+    profile = ProfileReport(df, title=title, minimal=len(df) > MINIMAL_ROWS, progress_bar=False)
+    fd, building = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.building-', suffix='.html')
+    os.close(fd)
+    try:
+        profile.to_file(building)
+        os.replace(building, path)
+    finally:
+        if os.path.exists(building):
+            os.remove(building)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build one profile report as HTML')
+    parser.add_argument('report', choices=sorted(PROFILE_FRAMES))
+    parser.add_argument('entity_id', type=int)
+    parser.add_argument('path')
+    args = parser.parse_args()
+    build_profile(args.report, args.entity_id, args.path)
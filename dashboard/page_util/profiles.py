@@ -0,0 +1,131 @@
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import streamlit as st
+
+from db_util.config import DB_PATH, db_generation
+
+# ydata_profiling reports are built in worker processes and stored as HTML, one
+# file per report, entity and data generation. Pages only ever read the file.
+PROFILE_DIR = os.path.join(os.path.dirname(DB_PATH), 'profiles')
+# Reports built at the same time, the others wait for a free worker
+PROFILE_WORKERS = int(os.environ.get('ETHER_DASH_PROFILE_WORKERS', 2))
+PROFILE_HEIGHT = 1000
+# Seconds between checks for a report that is still being built
+POLL_SECONDS = 3
+# Where python -m page_util.profile_worker is found
+DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Report path -> (report, entity id) of the reports waiting for a free worker
+_waiting = {}
+# Report path -> the worker process building it
+_builds = {}
+# Report path -> why building it failed
+_failures = {}
+_builds_lock = threading.Lock()
+
+
+def generation_dir(generation):
+    return os.path.join(PROFILE_DIR, str(generation))
+
+
+def profile_path(report, entity_id, generation):
+    return os.path.join(generation_dir(generation), f'{report}-{entity_id}.html')
+
+
+def log_path(path):
+    return f'{path}.log'
+
+
+def start_build(report, entity_id, path):
+    # A fresh interpreter rather than a multiprocessing worker: a spawned worker
+    # imports the __main__ of the server process, the page script that is running
+    with open(log_path(path), 'w') as log:
+        return subprocess.Popen([sys.executable, '-m', 'page_util.profile_worker', report, str(entity_id), path],
+                                cwd=DASHBOARD_DIR, stdout=log, stderr=subprocess.STDOUT)
+
+
+def start_waiting_builds():
+    # Oldest requests first
+    running = sum(1 for process in _builds.values() if process.poll() is None)
+    while _waiting and running < PROFILE_WORKERS:
+        path = next(iter(_waiting))
+        _builds[path] = start_build(*_waiting.pop(path), path)
+        running += 1
+
+
+def build_error(path):
+    # The last line the worker wrote, the exception that ended it
+    try:
+        with open(log_path(path)) as log:
+            lines = [line.strip() for line in log if line.strip()]
+    except FileNotFoundError:
+        lines = []
+    return lines[-1] if lines else 'the worker process exited without building it'
+
+
+def prune_generations(current):
+    # Reports of older generations can no longer be requested
+    _failures.clear()
+    for name in os.listdir(PROFILE_DIR):
+        if name != os.path.basename(current):
+            shutil.rmtree(os.path.join(PROFILE_DIR, name), ignore_errors=True)
+
+
+def request_profile(report, entity_id):
+    # Path of the stored report, None while it is built in the background.
+    # Raises a RuntimeError if building it failed, a failed report is not
+    # retried until the next data generation.
+    entity_id = entity_id.item() if isinstance(entity_id, np.generic) else entity_id
+    generation = db_generation()
+    path = profile_path(report, entity_id, generation)
+    with _builds_lock:
+        if os.path.exists(path):
+            _builds.pop(path, None)
+            return path
+        if path in _failures:
+            raise RuntimeError(_failures[path])
+        if path not in _builds and path not in _waiting:
+            if not os.path.isdir(generation_dir(generation)):
+                os.makedirs(generation_dir(generation))
+                prune_generations(generation_dir(generation))
+            _waiting[path] = (report, entity_id)
+        start_waiting_builds()
+        process = _builds.get(path)
+        if process is None or process.poll() is None:
+            return None
+        del _builds[path]
+        if process.returncode == 0 and os.path.exists(path):
+            return path
+        _failures[path] = build_error(path)
+        raise RuntimeError(_failures[path])
+
+
+def show_profile(report, entity_id):
+    # The stored report, or a placeholder that checks back until it is ready
+    @st.fragment(run_every=POLL_SECONDS)
+    def profile_placeholder():
+        try:
+            path = request_profile(report, entity_id)
+        except Exception as error:
+            st.error(f'The profile report could not be built: {error}')
+            return
+        if path is None:
+            st.info('The profile report is being built in the background, it will show here once ready.')
+        else:
+            st.rerun()
+
+    try:
+        path = request_profile(report, entity_id)
+    except Exception as error:
+        st.error(f'The profile report could not be built: {error}')
+        return
+    if path is None:
+        profile_placeholder()
+    else:
+        st.iframe(Path(path), height=PROFILE_HEIGHT)
@@ -1,23 +1,8 @@
-import os
-
-import pandas as pd
-import sqlalchemy
-import ydata_profiling
 import streamlit as st
-from streamlit_pandas_profiling import st_profile_report
-
-DIR_PATH = os.path.join(os.path.dirname(__file__), '..', 'db_util')
-
-# Create a connection to your SQLite database
-engine = sqlalchemy.create_engine(f'sqlite:///{DIR_PATH}/ethereum_tool.db')
-
 
-@st.cache_data
-def load_repositories():
-    # Assuming your repositories table is named 'repositories'
-    with engine.connect() as conn:
-        # Assuming your repositories table is named 'repositories'
-        return pd.read_sql("SELECT id, name FROM repositories ORDER BY name", conn)
+from db_util.queries import get_number_of_committers, load_activity, load_activity_days, load_repositories
+from page_util.pickers import date_range_picker
+from page_util.profiles import show_profile
 
 
 def setup_page():
@@ -62,33 +47,6 @@ def setup_page():
     st.markdown(tile_style, unsafe_allow_html=True)
 
 
-@st.cache_data
-def get_commits_by_repo(repo_id):
-    # Query to count commits per day for a given repository
-    query = f"""
-        SELECT DATE(created_at) as date, COUNT(*) as commit_count
-        FROM commits
-        WHERE repo_fk = {repo_id}
-        GROUP BY DATE(created_at) 
-        ORDER BY created_at DESC 
-        """
-    with engine.connect() as conn:
-        df = pd.read_sql(query, conn)
-        return df
-
-
-@st.cache_data
-def get_number_of_committers(repo_id):
-    # Query to count commits per day for a given repository
-    query = f"""
-        SELECT  COUNT(DISTINCT user_fk) as dev_count
-        FROM commits
-        WHERE repo_fk = {repo_id}
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn).loc[0, 'dev_count']
-
-
 def get_repo_index(repo_data):
     try:
         return repo_data['name'].tolist().index(st.session_state['repo_name'])
@@ -117,29 +75,32 @@ if repo_name:
     # Get repository ID based on selected name
     repo_id = repo_data[repo_data['name'] == repo_name]['id'].iloc[0]
 
-    # Get commit data for the selected repository
-    commit_data = get_commits_by_repo(repo_id)
+    # Days the repository has commits on, the chart covers the range picked
+    # among them
+    activity_days = load_activity_days(repo_id)
+    has_commits = 'commit' in activity_days.index
 
     # First row, spanning all columns for the plot
-    if not commit_data.empty:
-        commit_data.set_index('date', inplace=True)
-        st.write(f"Number of Commits Per Day for Repository: {repo_name}")
-        st.bar_chart(commit_data['commit_count'])
+    if has_commits:
+        start, end = date_range_picker(*activity_days.loc['commit'])
+        # Counted per day, week, month or year in SQL, so the chart stays small
+        # however long the range
+        activity = load_activity('commit', repo_id, start, end)
+        st.write(f"Number of Commits Per {activity['bucket'].title()} for Repository: {repo_name}")
+        st.bar_chart(activity['counts'].set_index('date')['count'])
     else:
         st.write("No commit data available for the selected repository.")
 
-    if not commit_data.empty:
+    if has_commits:
         # Subsequent rows with multiple columns
         col1, col2 = st.columns(2)
 
         with col1:
-            last_data = commit_data.index.values[0]
-            before_last_data = commit_data.index.values[1]
-            total_commits = commit_data.commit_count.sum()
-            delta_count = int(
-                commit_data.loc[last_data, 'commit_count'] - commit_data.loc[before_last_data, 'commit_count'])
-            st.metric("Commits", total_commits,
-                      delta=delta_count, delta_color="normal")
+            # Commits in the range, against as many days before it
+            delta_count = activity['total'] - activity['previous']
+            st.metric("Commits", activity['total'],
+                      delta=delta_count, delta_color="normal",
+                      help=f"Change from the {(end - start).days + 1} days before {start}")
             # st.markdown(f"<div class='tile tile-1'>Commits: {total_commits}</div>", unsafe_allow_html=True)
 
         with col2:
@@ -149,9 +110,4 @@ if repo_name:
             # st.markdown(f"<div class='tile tile-2'>Committers: {number_of_committers}</div>",
             #             unsafe_allow_html=True)
 
-        # with col3:
-        #     number_of_comments = get_number_of_comments(repo_id)
-        #     st.markdown(f"<div class='tile tile-3'>Comments: {number_of_comments}</div>", unsafe_allow_html=True)
-
-        commit_pr = commit_data.profile_report()
-        st_profile_report(commit_pr)
+        show_profile('commits', repo_id)
@@ -1,25 +1,15 @@
-import os
-
-import numpy as np
-import pandas as pd
-import sqlalchemy
-import ydata_profiling
-import plotly.express as px
 import streamlit as st
-from streamlit_pandas_profiling import st_profile_report
-
-DIR_PATH = os.path.join(os.path.dirname(__file__), '..', 'db_util')
-
-# Create a connection to your SQLite database
-engine = sqlalchemy.create_engine(f'sqlite:///{DIR_PATH}/ethereum_tool.db')
-
 
-@st.cache_data
-def load_repositories():
-    # Assuming your repositories table is named 'repositories'
-    with engine.connect() as conn:
-        # Assuming your repositories table is named 'repositories'
-        return pd.read_sql("SELECT id, name FROM repositories ORDER BY name", conn)
+from db_util.queries import (
+    load_activity,
+    load_activity_days,
+    load_comments_summary,
+    load_repo_labels,
+    load_repositories,
+    roll_up,
+)
+from page_util.pickers import date_range_picker
+from page_util.profiles import show_profile
 
 
 def setup_page():
@@ -72,96 +62,20 @@ def get_repo_index(repo_data):
         return 0
 
 
-@st.cache_data
-def get_number_of_comments(repo_id):
-    # Query to count commits per day for a given repository
-    query = f"""
-        SELECT  DATE(c.created_at) as date, COUNT(*) as comm_count
-        FROM issues AS s, comments AS c
-        WHERE s.repo_fk = {repo_id} AND s.id = c.issue_fk
-        GROUP BY DATE(c.created_at) 
-        ORDER BY c.created_at DESC
-        """
-    with engine.connect() as conn:
-        # return pd.read_sql(query, conn).loc[0, 'comm_count']
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def get_number_of_commenters(repo_id):
-    query = f"""
-        SELECT  COUNT(DISTINCT c.user_fk)  as user_count
-        FROM issues AS s, comments AS c
-        WHERE s.repo_fk = {repo_id} AND s.id = c.issue_fk
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn).loc[0, 'user_count']
-
-
-@st.cache_data
-def get_comments_sentiment(repo_id):
-    query = f"""
-        SELECT     c.sentiment AS Sentiment,  COUNT(*) AS Frequency
-        FROM  issues AS s, comments AS c
-        WHERE s.repo_fk = {repo_id} AND s.id = c.issue_fk
-        GROUP BY c.sentiment
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def get_comments_emotions(repo_id):
-    query = f"""
-        SELECT     c.emotion AS Emotion,  COUNT(*) AS Frequency
-        FROM  issues AS s, comments AS c
-        WHERE s.repo_fk = {repo_id} AND s.id = c.issue_fk
-        GROUP BY c.emotion
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def commenters_scatter_plot_data(repo_id):
-    query_comments = f"""
-        SELECT  c.user_fk AS user_id, c.author_association, COUNT(*)  AS comments_count
-        FROM issues AS s, comments AS c
-        WHERE s.repo_fk = {repo_id} AND s.id = c.issue_fk
-        GROUP BY c.user_fk
-        ORDER BY comments_count DESC 
-        """
-    query_issues = f"""
-            SELECT  s.user_fk AS user_id, COUNT(*)  AS issues_count
-            FROM issues AS s
-            WHERE s.repo_fk = {repo_id}
-            GROUP BY s.user_fk
-            ORDER BY issues_count DESC 
-            """
-    query_commits = f"""
-                SELECT  c.user_fk AS user_id, COUNT(*)  AS commits_count
-                FROM commits AS c
-                WHERE c.repo_fk = {repo_id}
-                GROUP BY c.user_fk
-                ORDER BY commits_count DESC 
-                """
-    with engine.connect() as conn:
-        df_comments = pd.read_sql(query_comments, conn)
-        df_comments.set_index('user_id', inplace=True)
-        df_issues = pd.read_sql(query_issues, conn)
-        df_issues.set_index('user_id', inplace=True)
-        df_commits = pd.read_sql(query_commits, conn)
-        df_commits.set_index('user_id', inplace=True)
-        df_merge = pd.merge(df_comments, df_issues, left_index=True, right_index=True, how='inner')
-        df_merge = pd.merge(df_merge, df_commits, left_index=True, right_index=True, how='inner')
-        conditions = [
-            df_merge['commits_count'] > df_merge['comments_count'],  # Condition for 'commiter'
-            df_merge['commits_count'] < df_merge['comments_count'],  # Condition for 'commenter'
-            df_merge['commits_count'] == df_merge['comments_count']  # Condition for 'contributor'
-        ]
-        choices = ['commiter', 'commenter', 'contributor']
-        df_merge['type'] = np.select(conditions, choices, default='Not Specified')
-        return df_merge
+def label_drill_down(repo_id, label, values):
+    # Issues, users and the other label behind one sentiment or emotion, summed
+    # from the repository's cells of the comment label cube
+    other = 'emotion' if label == 'sentiment' else 'sentiment'
+    value = st.selectbox(f'Drill down into a {label}', values.dropna(), key=f'{label}_drill_down')
+    cells = load_repo_labels(repo_id)
+    cells = cells[cells[label] == value]
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.dataframe(roll_up(cells, ['issue_fk']).head(10), hide_index=True, use_container_width=True)
+    with col2:
+        st.dataframe(roll_up(cells, ['user_fk']).head(10), hide_index=True, use_container_width=True)
+    with col3:
+        st.dataframe(roll_up(cells, [other]), hide_index=True, use_container_width=True)
 
 
 setup_page()
@@ -186,36 +100,42 @@ if repo_name:
     # Get repository ID based on selected name
     repo_id = repo_data[repo_data['name'] == repo_name]['id'].iloc[0]
 
-    # Get commit data for the selected repository
-    comments_data = get_number_of_comments(repo_id)
+    # Every chart and metric below but the activity chart comes from one query
+    # over the repository's comments
+    summary = load_comments_summary(repo_id)
+    activity_days = load_activity_days(repo_id)
+    has_comments = 'comment' in activity_days.index
+
+    if has_comments:
+        start, end = date_range_picker(*activity_days.loc['comment'])
+        # Counted per day, week, month or year in SQL, so the chart stays small
+        # however long the range
+        activity = load_activity('comment', repo_id, start, end)
+        st.write(f"Number of Comments Per {activity['bucket'].title()} for Repository: {repo_name}")
+        st.bar_chart(activity['counts'].set_index('date')['count'])
+        if has_comments:
+            # Imported on first use, plotly.express alone costs more than the rest of the page
+            import plotly.express as px
 
-    if not comments_data.empty:
-        comments_data.set_index('date', inplace=True)
-        st.write(f"Number of Comments Per Day for Repository: {repo_name}")
-        st.bar_chart(comments_data['comm_count'])
-        if not comments_data.empty:
             # Subsequent rows with multiple columns
             col1, col2 = st.columns(2)
 
             with col1:
-                last_data = comments_data.index.values[0]
-                before_last_data = comments_data.index.values[1]
-                total_commits = comments_data.comm_count.sum()
-                delta_count = int(
-                    comments_data.loc[last_data, 'comm_count'] - comments_data.loc[before_last_data, 'comm_count'])
-                st.metric("Comments", total_commits,
-                          delta=delta_count, delta_color="normal")
+                # Comments in the range, against as many days before it
+                delta_count = activity['total'] - activity['previous']
+                st.metric("Comments", activity['total'],
+                          delta=delta_count, delta_color="normal",
+                          help=f"Change from the {(end - start).days + 1} days before {start}")
 
             with col2:
-                number_of_committers = get_number_of_commenters(repo_id)
+                number_of_committers = summary['commenters']
                 st.metric("Commenters", number_of_committers,
                           delta=0, delta_color="normal")
 
             tab1, tab2, tab3, tab4 = st.tabs(["Plots", "Sentiment", "Emotion", "Statistics"])
 
             with tab1:
-                df = px.data.gapminder()
-                df_commenters = commenters_scatter_plot_data(repo_id)
+                df_commenters = summary['users']
 
                 fig = px.scatter(
                     df_commenters,
@@ -230,7 +150,7 @@ if repo_name:
                 st.plotly_chart(fig, theme="streamlit", use_container_width=True)
 
             with tab2:
-                sentiment_count = get_comments_sentiment(repo_id)
+                sentiment_count = summary['sentiment']
                 sentiment_count = sentiment_count.sort_values('Frequency', ascending=False)
                 # Create the Plotly bar plot
                 sentiment_count_fig = px.bar(sentiment_count,
@@ -241,11 +161,12 @@ if repo_name:
                                              title='Sentiment Levels')
                 # Show the plot
                 st.plotly_chart(sentiment_count_fig)
+                label_drill_down(repo_id, 'sentiment', sentiment_count['Sentiment'])
             with tab3:
                 col1, col2 = st.columns(2)
 
                 with col1:
-                    emotion_count = get_comments_emotions(repo_id)
+                    emotion_count = summary['emotion']
                     emotion_count = emotion_count.sort_values('Frequency', ascending=False)
                     neutral_count = emotion_count[emotion_count['Emotion'] == 'neutral'].Frequency.values[0]
                     emotion_count = emotion_count[~emotion_count.Emotion.isin(['neutral'])]
@@ -262,10 +183,10 @@ if repo_name:
                     if neutral_count:
                         st.metric("Neutral", neutral_count,
                                   delta=0, delta_color="normal")
+                label_drill_down(repo_id, 'emotion', summary['emotion']['Emotion'])
 
             with tab4:
-                commit_pr = df_commenters.profile_report()
-                st_profile_report(commit_pr)
+                show_profile('commenters', repo_id)
 
 else:
     st.write("No comments data available for the selected repository.")
@@ -1,31 +1,22 @@
-import base64
-import os
-
 import pandas as pd
-import sqlalchemy
 import streamlit as st
-import plotly.express as px
 import textwrap
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-
-from streamlit_agraph import agraph, Node, Edge, Config
-
-
-IMG_DIR_PATH = os.path.dirname(os.path.abspath(__file__))
-
-DIR_PATH = os.path.join(os.path.dirname(__file__), '..', 'db_util')
 
-# Create a connection to your SQLite database
-engine = sqlalchemy.create_engine(f'sqlite:///{DIR_PATH}/ethereum_tool.db')
-
-
-@st.cache_data
-def load_repositories():
-    # Assuming your repositories table is named 'repositories'
-    with engine.connect() as conn:
-        # Assuming your repositories table is named 'repositories'
-        return pd.read_sql("SELECT id, name FROM repositories ORDER BY name", conn)
+from db_util.queries import (
+    get_comments_by_issue,
+    get_events_by_issue,
+    get_reactions_by_issue,
+    load_issue,
+    load_issue_labels,
+    load_issue_page,
+    load_issue_terms,
+    load_repositories,
+    roll_up,
+    search_issues,
+)
+from db_util.terms import term_frequencies
+from page_util.graphs import issue_graph, render_graph
+from page_util.pickers import paged_picker
 
 
 def setup_page():
@@ -70,11 +61,6 @@ def setup_page():
     st.markdown(tile_style, unsafe_allow_html=True)
 
 
-def get_image_as_base64(path):
-    with open(path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode()
-
-
 def get_repo_index(repo_data):
     try:
         return repo_data['name'].tolist().index(st.session_state['repo_name'])
@@ -83,6 +69,11 @@ def get_repo_index(repo_data):
         return 0
 
 
+def issue_label(number, title):
+    # Issue number and title, as the issue tracker shows them
+    return f'#{number} {title}' if pd.notna(number) else title
+
+
 def get_delta_value(df, column_name):
     last_data = df.index.values[0]
     before_last_data = df.index.values[1]
@@ -90,73 +81,6 @@ def get_delta_value(df, column_name):
     return int(df.loc[last_data, column_name] - df.loc[before_last_data, column_name])
 
 
-@st.cache_data
-def load_issues(repo_id):
-    # Assuming your repositories table is named 'repositories'
-    # Query to count commits per day for a given repository
-    query = f"""
-        SELECT id
-        FROM issues
-        WHERE repo_fk = {repo_id}
-        ORDER BY comments DESC 
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def load_issue(issue_id):
-    # Assuming your repositories table is named 'repositories'
-    # Query to count commits per day for a given repository
-    query = f"""
-        SELECT *
-        FROM issues
-        WHERE id = {issue_id}
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn).iloc[0]
-
-
-@st.cache_data
-def get_comments_by_issue(issue_id):
-    # Query to count commits per day for a given repository
-    query = f"""
-        SELECT  *
-        FROM comments AS c
-        WHERE c.issue_fk = {issue_id}
-        GROUP BY DATE(c.created_at) 
-        ORDER BY c.created_at DESC
-        """
-    with engine.connect() as conn:
-        # return pd.read_sql(query, conn).loc[0, 'comm_count']
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def get_reactions_by_issue(issue_id):
-    query = f"""
-        SELECT  r.*
-        FROM reactions AS r, comments AS c
-        WHERE c.issue_fk = {issue_id} AND r.comment_id = c.id
-        ORDER BY r.created_at DESC 
-        """
-    with engine.connect() as conn:
-        # return pd.read_sql(query, conn).loc[0, 'comm_count']
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def get_events_by_issue(issue_id):
-    query = f"""
-        SELECT *
-        FROM events
-        WHERE issue_fk = {issue_id}
-        """
-    with engine.connect() as conn:
-        # return pd.read_sql(query, conn).loc[0, 'comm_count']
-        return pd.read_sql(query, conn)
-
-
 setup_page()
 
 if 'repo_name' not in st.session_state:
@@ -177,12 +101,25 @@ if repo_name:
     # Get repository ID based on selected name
     repo_id = repo_data[repo_data['name'] == repo_name]['id'].iloc[0]
 
-    issues_data = load_issues(repo_id)
-    issue_id = st.sidebar.selectbox('Select an Issue', issues_data['id'])
+    search = st.sidebar.text_input('Search issues', placeholder='Words in titles, descriptions or comments')
+    if search:
+        # The issues matching the search, best first, instead of every issue
+        hits = search_issues(repo_id, search)
+        with st.expander(f"Issues matching '{search}' ({len(hits)})", expanded=True):
+            for hit in hits.itertuples():
+                st.markdown(f"**{issue_label(hit.number, hit.title)}**  \n{hit.snippet}")
+        titles = dict(zip(hits['id'], zip(hits['number'], hits['title'])))
+        issue_id = st.sidebar.selectbox('Select an Issue', list(titles),
+                                        format_func=lambda option: issue_label(*titles[option]))
+    else:
+        # The most commented issues, a page at a time
+        issue_id = paged_picker('Select an Issue', 'issue_picker',
+                                lambda after, limit: load_issue_page(repo_id, after, limit),
+                                'id', ('comments', 'id'),
+                                lambda row: f"{issue_label(row['number'], row['title'])} ({row['comments']} comments)",
+                                scope=repo_id)
 
     if issue_id:
-        issue_id = issues_data[issues_data['id'] == issue_id]['id'].iloc[0]
-
         issue = load_issue(issue_id)
         if not issue.empty:
             st.markdown(f"# Title: {issue.title}")
@@ -195,6 +132,9 @@ if repo_name:
 
             comments = get_comments_by_issue(issue_id)
             if not reactions.empty:
+                # Imported on first use, plotly.express alone costs more than the rest of the page
+                import plotly.express as px
+
                 one_sum = reactions.plus_one.sum()
                 minus_one_sum = reactions.minus_one.sum()
                 laugh_sum = reactions.laugh.sum()
@@ -269,22 +209,22 @@ if repo_name:
                                   delta=0, delta_color="normal")
 
                 with tab2:
-                    text = " ".join(comments.body.values)
-                    wordcloud = WordCloud(width=800,
-                                          height=400,
-                                          min_word_length=3,
-                                          normalize_plurals=True,
-                                          background_color='white').generate(text)
-                    # Display the generated image using matplotlib
-                    fig, ax = plt.subplots()
-                    ax.imshow(wordcloud, interpolation='bilinear')
-                    ax.axis('off')  # Remove axis
-
-                    # Display the plot in Streamlit
-                    st.image(wordcloud.to_array())
+                    # Term counts of all the issue's comments, tokenized at import time
+                    frequencies = term_frequencies(load_issue_terms(issue_id))
+                    if frequencies:
+                        from wordcloud import WordCloud
+                        wordcloud = WordCloud(width=800,
+                                              height=400,
+                                              background_color='white').generate_from_frequencies(frequencies)
+                        # Display the plot in Streamlit
+                        st.image(wordcloud.to_array())
+                    else:
+                        st.write("No comments on this issue.")
 
                 with tab3:
-                    sentiment_df = comments['sentiment'].value_counts().reset_index()
+                    # Counted over all the issue's comments in the comment label cube
+                    labels = load_issue_labels(issue_id)
+                    sentiment_df = roll_up(labels, ['sentiment']).dropna()
                     sentiment_df.columns = ['Sentiment', 'Count']
 
                     # Sort the DataFrame by 'Count' in descending order
@@ -303,7 +243,7 @@ if repo_name:
                 with tab4:
                     col1, col2 = st.columns(2)
 
-                    emotion_df = comments['emotion'].value_counts().reset_index()
+                    emotion_df = roll_up(labels, ['emotion']).dropna()
                     emotion_df.columns = ['Emotion', 'Count']
                     emotion_df.set_index('Emotion', inplace=True)
                     emotion_df = emotion_df.sort_values('Count', ascending=False)
@@ -327,48 +267,14 @@ if repo_name:
                                       delta=0, delta_color="normal")
 
                 with tab5:
-                    dev_main_img = get_image_as_base64(f"{IMG_DIR_PATH}/../imgs/dev_main.png")
-                    dev_img = get_image_as_base64(f"{IMG_DIR_PATH}/../imgs/dev.png")
                     if not comments.empty:
-                        nodes = []
-                        edges = []
-                        comments_rows = comments.to_dict("records")
-                        user_ids = set([c['user_fk'] for c in comments_rows])
-                        nodes.append(Node(id=int(issue['user_fk']),
-                                          label=int(issue['user_fk']),
-                                          size=30,
-                                          shape="circularImage",
-                                          image=f"data:image/jpeg;base64,{dev_main_img}"
-                                          ))
-                        if int(issue['user_fk']) in user_ids:
-                            user_ids.remove(int(issue['user_fk']))
-                        for user_id in user_ids:
-                            nodes.append(Node(id=user_id,
-                                              label=user_id,
-                                              size=20,
-                                              shape="circularImage",
-                                              image=f"data:image/jpeg;base64,{dev_img}"
-                                              ))
-                        if len(comments_rows) > 1:
-                            for i, comment in enumerate(comments_rows[:len(comments_rows) - 1]):
-                                edges.append(Edge(source=comment["user_fk"],
-                                                  # label="contributed",
-                                                  target=comments_rows[i + 1]["user_fk"],
-                                                  # **kwargs
-                                                  )
-                                             )
-                        config = Config(
-                            width=1000,
-                            height=800,
-                            directed=True,
-                            # physics=True,
-                            # hierarchical=True,
-                            # **kwargs
-                        )
-
-                        return_value = agraph(nodes=nodes,
-                                              edges=edges,
-                                              config=config)
+                        render_graph(issue_graph(int(issue['user_fk']), comments['user_fk'].tolist()),
+                                     width=1000,
+                                     height=800,
+                                     directed=True,
+                                     # physics=True,
+                                     # hierarchical=True,
+                                     )
                 with tab6:
 
                     col1, col2 = st.columns(2)
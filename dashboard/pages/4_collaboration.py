@@ -1,115 +1,25 @@
-import base64
-import os
-
-import pandas as pd
-import plotly.express as px
-import sqlalchemy
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
 import streamlit as st
 
-from streamlit_agraph import agraph, Node, Edge, Config
-import ydata_profiling
-from streamlit_pandas_profiling import st_profile_report
-
-IMG_DIR_PATH = os.path.dirname(os.path.abspath(__file__))
-
-DIR_PATH = os.path.join(os.path.dirname(__file__), '..', 'db_util')
-
-# Create a connection to your SQLite database
-engine = sqlalchemy.create_engine(f'sqlite:///{DIR_PATH}/ethereum_tool.db')
-
-
-@st.cache_data
-def load_repositories():
-    # Assuming your repositories table is named 'repositories'
-    with engine.connect() as conn:
-        # Assuming your repositories table is named 'repositories'
-        return pd.read_sql("SELECT id, name FROM repositories ORDER BY name", conn)
-
-
-def get_image_as_base64(path):
-    with open(path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode()
+from db_util.queries import (
+    load_co_committers,
+    load_committer_page,
+    load_commits,
+    load_files,
+    load_repositories,
+    load_user_labels,
+    load_user_terms,
+    roll_up,
+)
+from db_util.terms import term_frequencies
+from page_util.graphs import file_graph, render_graph
+from page_util.pickers import paged_picker
+from page_util.profiles import show_profile
 
 
 def create_nx_graph(commiter_id):
     commits = load_commits(commiter_id)[:100]
 
 
-@st.cache_data
-def get_comments_by_issue(issue_id):
-    query = f"""
-        SELECT  *
-        FROM comments AS c
-        WHERE c.issue_fk = {issue_id}
-        GROUP BY DATE(c.created_at) 
-        ORDER BY c.created_at DESC
-        """
-    with engine.connect() as conn:
-        # return pd.read_sql(query, conn).loc[0, 'comm_count']
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def load_committers(repo_id):
-    query = f"""
-        SELECT user_fk, COUNT(*) as commits_count
-        FROM commits
-        WHERE repo_fk = {repo_id} AND user_fk IS NOT NULL
-        GROUP BY user_fk
-        ORDER BY commits_count DESC 
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def load_commits(commiter_id):
-    query = f"""
-        SELECT *
-        FROM commits
-        WHERE user_fk = {commiter_id}
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def load_files(committer_id):
-    query = f"""
-        SELECT fc.user_fk, f.name, f.id
-        FROM file_commits AS fc, files AS f
-        WHERE f.id = fc.file_fk AND fc.user_fk = {committer_id}
-        GROUP BY fc.user_fk, fc.file_fk
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def load_file_committers(file_id, committer_id):
-    query = f"""
-        SELECT DISTINCT fc.user_fk
-        FROM file_commits AS fc
-        WHERE fc.file_fk = '{file_id}' AND fc.user_fk <> {committer_id}
-        GROUP BY fc.user_fk, fc.file_fk
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
-
-
-@st.cache_data
-def load_sentiment(committer_id):
-    query = f"""
-        SELECT body, sentiment, emotion
-        FROM comments
-        WHERE user_fk = {committer_id}
-        """
-    with engine.connect() as conn:
-        return pd.read_sql(query, conn)
-
-
 def get_repo_index(repo_data):
     try:
         return repo_data['name'].tolist().index(st.session_state['repo_name'])
@@ -139,95 +49,53 @@ if repo_name:
     repo_id = repo_data[repo_data['name'] == repo_name]['id'].iloc[0]
 
     if repo_id:
-        commiters_data = load_committers(repo_id)
-        committer_id = st.sidebar.selectbox('Select an Commiter', commiters_data['user_fk'])
+        # The most active committers, or those whose name starts with the filter,
+        # a page at a time
+        name_filter = st.sidebar.text_input('Filter committers', placeholder='Start of a name').strip()
+        committer_id = paged_picker('Select an Commiter', 'committer_picker',
+                                    lambda after, limit: load_committer_page(repo_id, name_filter, after, limit),
+                                    'user_fk', ('name', 'user_fk') if name_filter else ('commit_count', 'user_fk'),
+                                    lambda row: f"{row['name'] or row['user_fk']} ({row['commit_count']} commits)",
+                                    scope=(repo_id, name_filter))
 
         if committer_id:
+            # Imported on first use, plotly.express alone costs more than the rest of the page
+            import plotly.express as px
+
             commits = load_commits(committer_id)[:100]
             files = load_files(committer_id)
+            # file id -> other committers of the file, for all files at once
+            co_committers = load_co_committers(committer_id).groupby('file_fk')['user_fk'].apply(list).to_dict()
 
-            dev_img = get_image_as_base64(f"{IMG_DIR_PATH}/../imgs/dev.png")
-            dev_main_img = get_image_as_base64(f"{IMG_DIR_PATH}/../imgs/dev_main.png")
-            file_img = get_image_as_base64(f"{IMG_DIR_PATH}/../imgs/file.png")
-
-            tab1, tab2, tab3, tab4, tab5 = st.tabs(["Files", "Word Cloud", "Sentiment",
-                                                    "Emotion", "Statistics"])
+            tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Files", "Word Cloud", "Sentiment",
+                                                          "Emotion", "Statistics", "Collaborators"])
             with tab1:
                 if not commits.empty:
-                    nodes = []
-                    dev_nodes = set()
-                    edges = []
-
-                    nodes.append(
-                        Node(id=committer_id,
-                             label=committer_id,
-                             size=30,
-                             shape="circularImage",
-                             image=f"data:image/jpeg;base64,{dev_main_img}")
-                    )
-                    for file in files.to_dict("records"):
-                        if file['id'] not in dev_nodes:
-                            dev_nodes.add(file['id'])
-                            nodes.append(
-                                Node(id=file["id"],
-                                     title=file["name"],
-                                     size=15,
-                                     shape="circularImage",
-                                     image=f"data:image/jpeg;base64,{file_img}")
-                            )
-                        edges.append(
-                            Edge(source=committer_id,
-                                 # label="committed",
-                                 target=file["id"],
+                    render_graph(file_graph(committer_id, files, co_committers),
+                                 width=1000,
+                                 height=800,
+                                 directed=True,
+                                 # physics=True,
+                                 # hierarchical=True,
                                  )
-                        )
-                        for file_committer in load_file_committers(file['id'], committer_id).to_dict("records"):
-                            if file_committer["user_fk"] not in dev_nodes:
-                                dev_nodes.add(file_committer["user_fk"])
-                                nodes.append(
-                                    Node(id=file_committer["user_fk"],
-                                         size=20,
-                                         shape="circularImage",
-                                         image=f"data:image/jpeg;base64,{dev_img}")
-                                )
-                            edges.append(
-                                Edge(source=file_committer["user_fk"],
-                                     # label="committed",
-                                     target=file["id"],
-                                     )
-                            )
-
-                    config = Config(
-                        width=1000,
-                        height=800,
-                        directed=True,
-                        # physics=True,
-                        # hierarchical=True,
-                        # **kwargs
-                    )
-
-                    return_value = agraph(nodes=nodes,
-                                          edges=edges,
-                                          config=config)
 
             with tab2:
-                comments = load_sentiment(committer_id)
-                text = " ".join(comments.body.values)
-                wordcloud = WordCloud(width=800,
-                                      height=400,
-                                      min_word_length=3,
-                                      normalize_plurals=True,
-                                      background_color='white').generate(text)
-                # Display the generated image using matplotlib
-                fig, ax = plt.subplots()
-                ax.imshow(wordcloud, interpolation='bilinear')
-                ax.axis('off')  # Remove axis
-
-                # Display the plot in Streamlit
-                st.image(wordcloud.to_array())
+                # Term counts of all the committer's comments, tokenized at import time
+                frequencies = term_frequencies(load_user_terms(committer_id))
+                if frequencies:
+                    from wordcloud import WordCloud
+                    wordcloud = WordCloud(width=800,
+                                          height=400,
+                                          background_color='white').generate_from_frequencies(frequencies)
+                    # Display the plot in Streamlit
+                    st.image(wordcloud.to_array())
+                else:
+                    st.write("No comments written by this committer.")
 
             with tab3:
-                sentiment_df = comments[['sentiment']].value_counts().reset_index()
+                # Counted in the comment label cube, without reading the comments
+                labels = load_user_labels(committer_id)
+                sentiment_df = roll_up(labels, ['sentiment']).dropna()
                 sentiment_df.columns = ['Sentiment', 'Count']
                 sentiment_df = sentiment_df.sort_values('Count', ascending=False)
                 # Create the Plotly bar plot
@@ -241,7 +109,7 @@ if repo_name:
                 st.plotly_chart(sent_fig)
 
             with tab4:
-                emotion_df = comments[['emotion']].value_counts().reset_index()
+                emotion_df = roll_up(labels, ['emotion']).dropna()
                 emotion_df.columns = ['Emotion', 'Count']
 
                 emotion_df = emotion_df.sort_values('Count', ascending=False)
@@ -266,5 +134,13 @@ if repo_name:
                         st.metric("Neutral", neutral_count,
                                   delta=0, delta_color="normal")
             with tab5:
-                comments_pr = comments[['body', 'sentiment', 'emotion']].profile_report()
-                st_profile_report(comments_pr)
+                show_profile('committer_comments', committer_id)
+            with tab6:
+                # Every tab runs on every render, the matrix is only loaded once asked for
+                if st.toggle('Rank collaborators', key='rank_collaborators'):
+                    # Pulls in scipy.sparse
+                    from db_util.collaboration import SIMILARITY_METRICS, get_collaboration_matrix
+                    metric = st.selectbox('Rank by', SIMILARITY_METRICS)
+                    top_k = st.slider('Collaborators', min_value=5, max_value=50, value=10)
+                    collaborators = get_collaboration_matrix().top_collaborators(committer_id, k=top_k, metric=metric)
+                    st.dataframe(collaborators, hide_index=True, use_container_width=True)
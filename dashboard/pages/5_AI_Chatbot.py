@@ -1,5 +1,3 @@
-# First
-import openai
 import streamlit as st
 
 with st.sidebar:
@@ -20,6 +18,9 @@ if prompt := st.chat_input():
         st.info("Please add your OpenAI API key to continue.")
         st.stop()
 
+    # Only needed once there is a prompt to send
+    import openai
+
     openai.api_key = openai_api_key
     st.session_state.messages.append({"role": "user", "content": prompt})
     st.chat_message("user").write(prompt)
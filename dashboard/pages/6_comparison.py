@@ -0,0 +1,98 @@
+import streamlit as st
+
+from db_util.queries import load_comparison, load_comparison_activity, load_repositories
+from page_util.pickers import date_range_picker
+
+# Repositories compared when the page is opened, the selected one first
+DEFAULT_REPOS = 3
+# Columns of the ranking, by the column of load_comparison they show. The
+# share of each sentiment label the comments carry follows them.
+RANKING_COLUMNS = {
+    'commit_count': 'Commits',
+    'committer_count': 'Committers',
+    'comment_count': 'Comments',
+    'commenter_count': 'Commenters',
+}
+SHARE_SUFFIX = '_share'
+
+
+def setup_page():
+    # Hide the 'Made with Streamlit' footer by injecting custom CSS
+    hide_streamlit_style = """
+                <style>
+                #MainMenu {visibility: hidden;}
+                footer {visibility: hidden;}
+                </style>
+                """
+    st.markdown(hide_streamlit_style, unsafe_allow_html=True)
+    # CSS to hide the Streamlit "Deploy" button
+    hide_deploy_button = """
+                <style>
+                #MainMenu {visibility: hidden;}
+                .stDeployButton {visibility: hidden;}
+                </style>
+                """
+    st.markdown(hide_deploy_button, unsafe_allow_html=True)
+
+
+def default_repos(repo_names):
+    # The repository selected on the other pages, then the first ones
+    selected = st.session_state.get('repo_name')
+    names = ([selected] if selected in repo_names else []) + [name for name in repo_names if name != selected]
+    return names[:DEFAULT_REPOS]
+
+
+def ranking_columns(repos):
+    shares = {column: f'{column.removesuffix(SHARE_SUFFIX).title()} comments %'
+              for column in repos.columns if column.endswith(SHARE_SUFFIX)}
+    return {**RANKING_COLUMNS, **shares}
+
+
+def ranking(repos, repo_names, columns, rank_by):
+    # One row per repository, the sentiment shares in percent, best first
+    table = repos.reindex(columns=list(columns))
+    share_columns = [column for column in columns if column.endswith(SHARE_SUFFIX)]
+    table[share_columns] = table[share_columns] * 100
+    table = table.rename(columns=columns)
+    table.insert(0, 'Repository', table.index.map(repo_names))
+    table = table.sort_values(rank_by, ascending=False)
+    table.insert(0, 'Rank', range(1, len(table) + 1))
+    return table
+
+
+setup_page()
+
+st.title('Comparison')
+
+repo_data = load_repositories()
+repo_names = dict(zip(repo_data['id'], repo_data['name']))
+selected_names = st.sidebar.multiselect('Select Repositories', repo_data['name'],
+                                        default=default_repos(repo_data['name'].tolist()))
+
+if selected_names:
+    repo_ids = tuple(repo_data[repo_data['name'].isin(selected_names)]['id'].tolist())
+    # Totals, sentiment and the span of the activity of all the repositories
+    # come from one grouped query, the charts below from another, however
+    # many repositories are compared
+    comparison = load_comparison(repo_ids)
+
+    if 'first_day' in comparison:
+        start, end = date_range_picker(comparison['first_day'], comparison['last_day'])
+        activity = load_comparison_activity(repo_ids, start, end)
+        counts = activity['counts']
+        for activity_name, title in [('commit', 'Commits'), ('comment', 'Comments')]:
+            st.write(f"Number of {title} Per {activity['bucket'].title()}")
+            # One line per repository, buckets without activity count as zero
+            series = counts[counts['activity'] == activity_name].pivot(index='date', columns='repo_fk', values='count')
+            st.line_chart(series.rename(columns=repo_names).fillna(0))
+    else:
+        st.write("No activity data available for the selected repositories.")
+
+    columns = ranking_columns(comparison['repos'])
+    rank_by = st.selectbox('Rank by', list(columns.values()))
+    column_config = {title: st.column_config.NumberColumn(format='%.1f' if title.endswith('%') else '%.0f')
+                     for title in columns.values()}
+    st.dataframe(ranking(comparison['repos'], repo_names, columns, rank_by), hide_index=True,
+                 use_container_width=True, column_config=column_config)
+else:
+    st.write("Select repositories to compare.")
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# db_util reads where the data and the database are when it is imported, point
+# it at a scratch directory before any test imports it
+SCRATCH_DIR = tempfile.mkdtemp(prefix='ether_dash_tests_')
+os.environ['ETHER_DASH_DATA_DIR'] = os.path.join(SCRATCH_DIR, 'data')
+os.environ['ETHER_DASH_DB_PATH'] = os.path.join(SCRATCH_DIR, 'ethereum_tool.db')
@@ -0,0 +1,34 @@
+import os
+import time
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.generate_data import generate
+from db_util import db_import
+
+pytest.importorskip('ydata_profiling')
+
+PAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pages', '1_commits.py')
+TIMEOUT_SECONDS = 120
+
+
+def building(app):
+    return [info.value for info in app.info if 'profile report is being built' in info.value]
+
+
+def test_profile_requested_by_a_page_is_built(monkeypatch):
+    generate(os.environ['ETHER_DASH_DATA_DIR'], comments=2000)
+    monkeypatch.setattr(db_import, 'DATA_DIR', os.environ['ETHER_DASH_DATA_DIR'])
+    db_import.import_db(db_path=os.environ['ETHER_DASH_DB_PATH'])
+
+    app = AppTest.from_file(PAGE, default_timeout=TIMEOUT_SECONDS).run()
+    assert building(app)
+    # Every rerun checks on the worker, as the placeholder does while the page is open
+    deadline = time.monotonic() + TIMEOUT_SECONDS
+    while building(app):
+        assert time.monotonic() < deadline, 'the profile report was not built in time'
+        time.sleep(1)
+        app.run()
+    assert not app.exception
+    assert not [error.value for error in app.error]
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from benchmarks.generate_data import generate
+from db_util import db_import
+from db_util.config import db_generation
+from db_util.snapshots import load_repo_snapshot, snapshot_dir
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / 'data')
+    generate(path, comments=2000)
+    monkeypatch.setattr(db_import, 'DATA_DIR', path)
+    return path
+
+
+def repo_comments(db_path, repo_id):
+    # A repository's comments as SQLite has them, in the columns of the snapshot
+    with sqlite3.connect(db_path) as conn:
+        frame = pd.read_sql('SELECT c.id, c.user_fk, c.author_association FROM issues AS s, comments AS c '
+                            'WHERE s.repo_fk = ? AND s.id = c.issue_fk', conn, params=[repo_id])
+    return frame.sort_values('id').reset_index(drop=True)
+
+
+def snapshot_comments(db_path, repo_id):
+    frame = load_repo_snapshot('comments', repo_id, columns=['id', 'user_fk', 'author_association'],
+                               db_path=db_path)
+    return frame.sort_values('id').reset_index(drop=True)
+
+
+def assert_snapshot_matches(db_path):
+    with sqlite3.connect(db_path) as conn:
+        repos = pd.read_sql('SELECT id FROM repositories', conn)['id']
+    for repo_id in repos:
+        pd.testing.assert_frame_equal(snapshot_comments(db_path, repo_id), repo_comments(db_path, repo_id),
+                                      check_dtype=False, obj=f'repo {repo_id}')
+
+
+def test_snapshot_of_a_full_import(tmp_path, data_dir):
+    db_path = str(tmp_path / 'full.db')
+    db_import.import_db(db_path=db_path)
+    assert os.listdir(snapshot_dir(db_path)) == [db_generation(db_path)]
+    assert_snapshot_matches(db_path)
+
+
+def test_snapshot_follows_comments_moved_by_an_update(tmp_path, data_dir):
+    db_path = str(tmp_path / 'incremental.db')
+    db_import.import_db(db_path=db_path)
+    first_generation = db_generation(db_path)
+
+    path = os.path.join(data_dir, 'issues.csv')
+    issues = pd.read_csv(path, dtype=str, keep_default_na=False)
+    # Moving issues to another repository moves their comments out of its partition
+    source = issues['repo_fk'].value_counts().index[0]
+    moved = issues.index[issues['repo_fk'] == source][:10]
+    issues.loc[moved, 'repo_fk'] = next(repo for repo in issues['repo_fk'].unique() if repo != source)
+    issues.to_csv(path, index=False)
+    db_import.update_db(db_path=db_path)
+
+    assert os.listdir(snapshot_dir(db_path)) == [db_generation(db_path)]
+    assert db_generation(db_path) != first_generation
+    assert_snapshot_matches(db_path)
+
+
+def test_no_snapshot_before_it_is_written(tmp_path):
+    assert load_repo_snapshot('comments', 1, db_path=str(tmp_path / 'missing.db')) is None
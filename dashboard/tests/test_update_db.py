@@ -0,0 +1,109 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from benchmarks.generate_data import generate
+from db_util import db_import
+
+# Tables update_db refreshes from the rows it changed instead of rebuilding them
+ROLLUP_TABLES = ['daily_commits', 'daily_comments', 'repo_committers', 'repo_activity']
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / 'data')
+    generate(path, comments=2000)
+    monkeypatch.setattr(db_import, 'DATA_DIR', path)
+    return path
+
+
+def edit_csv(data_dir, file_name, edit):
+    # Read as text, so ids and timestamps are written back exactly as they were
+    path = os.path.join(data_dir, file_name)
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    edit(frame)
+    frame.to_csv(path, index=False)
+
+
+def read_table(db_path, table, columns='*'):
+    # Without surrogate ids, which depend on the order the rows were written in
+    with sqlite3.connect(db_path) as conn:
+        frame = pd.read_sql(f'SELECT {columns} FROM {table}', conn).drop(columns=['id'], errors='ignore')
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+
+def updated_and_rebuilt(tmp_path, data_dir, file_name, edit):
+    # The database update_db makes of the edited CSV, and the one a full import makes
+    incremental = str(tmp_path / 'incremental.db')
+    db_import.import_db(db_path=incremental)
+    edit_csv(data_dir, file_name, edit)
+    db_import.update_db(db_path=incremental)
+    full = str(tmp_path / 'full.db')
+    db_import.import_db(db_path=full)
+    return incremental, full
+
+
+def assert_same_tables(incremental, full, tables):
+    for table in tables:
+        pd.testing.assert_frame_equal(read_table(incremental, table), read_table(full, table), obj=table)
+
+
+def busiest(frame, column):
+    return frame[column].value_counts().index[0]
+
+
+def test_commits_moved_to_another_repo(tmp_path, data_dir):
+    def move(commits):
+        source = busiest(commits, 'repo_fk')
+        moved = commits.index[commits['repo_fk'] == source][:30]
+        commits.loc[moved, 'repo_fk'] = next(repo for repo in commits['repo_fk'].unique() if repo != source)
+
+    incremental, full = updated_and_rebuilt(tmp_path, data_dir, 'commits.csv', move)
+    assert_same_tables(incremental, full, ROLLUP_TABLES)
+
+
+def test_issues_moved_to_another_repo(tmp_path, data_dir):
+    def move(issues):
+        source = busiest(issues, 'repo_fk')
+        moved = issues.index[issues['repo_fk'] == source][:10]
+        issues.loc[moved, 'repo_fk'] = next(repo for repo in issues['repo_fk'].unique() if repo != source)
+
+    incremental, full = updated_and_rebuilt(tmp_path, data_dir, 'issues.csv', move)
+    assert_same_tables(incremental, full, ROLLUP_TABLES)
+
+
+def test_comments_moved_to_an_issue_of_another_repo(tmp_path, data_dir):
+    issue_repos = pd.read_csv(os.path.join(data_dir, 'issues.csv'), dtype=str).set_index('id')['repo_fk']
+
+    def move(comments):
+        repos = comments['issue_fk'].map(issue_repos)
+        source = repos.value_counts().index[0]
+        target = next(issue for issue, repo in issue_repos.items() if repo != source)
+        comments.loc[comments.index[repos == source][:30], 'issue_fk'] = target
+
+    incremental, full = updated_and_rebuilt(tmp_path, data_dir, 'comments_with_sent_emo.csv', move)
+    assert_same_tables(incremental, full, ROLLUP_TABLES + ['comment_labels'])
+
+
+def test_comments_moved_to_another_user_and_issue(tmp_path, data_dir):
+    def move(comments):
+        moved = comments.index[comments['issue_fk'] == busiest(comments, 'issue_fk')][:20]
+        comments.loc[moved, 'issue_fk'] = comments['issue_fk'].iloc[-1]
+        comments.loc[moved, 'user_fk'] = comments['user_fk'].iloc[-1]
+
+    incremental, full = updated_and_rebuilt(tmp_path, data_dir, 'comments_with_sent_emo.csv', move)
+    assert_same_tables(incremental, full, ['user_terms', 'issue_terms'])
+
+
+def test_comments_moved_off_an_issue_leave_its_search_document(tmp_path, data_dir):
+    def move(comments):
+        moved = comments.index[comments['issue_fk'] == busiest(comments, 'issue_fk')]
+        comments.loc[moved, 'issue_fk'] = comments['issue_fk'].iloc[-1]
+
+    incremental, full = updated_and_rebuilt(tmp_path, data_dir, 'comments_with_sent_emo.csv', move)
+    # The issue id is the rowid of its document
+    columns = 'rowid AS issue_id, title, body, comments, repo'
+    pd.testing.assert_frame_equal(read_table(incremental, 'issue_text', columns),
+                                  read_table(full, 'issue_text', columns))